@@ -23,20 +23,26 @@ from __future__ import division
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-from math import sqrt
+from collections import Counter, OrderedDict, defaultdict
+from itertools import compress, repeat
 from builtins import range
 from builtins import str as text
 
+import weakref
 import numpy as np
 
+from scipy.linalg.blas import dsyrk, ssyrk
+
 from .Segmentation import Segmentation
 from .Table import *
 from .Utils import (
     get_average,
     get_variety,
     get_expected_subsample_variety,
-    tuple_to_simple_dict,
-    sample_dict,
+    _get_expected_subsample_variety,
+    _get_frequency_array,
+    _get_subsample_varieties,
+    tuple_to_simple_dicts,
     prepend_unit_with_category,
     generate_random_annotation_key,
     get_unused_char_in_segmentation,
@@ -46,6 +52,173 @@ from .Utils import (
 __version__ = "1.0.6"
 
 
+def _get_unit_seq_codes(
+    unit_segmentation,
+    unit_annotation_key=None,
+    unit_seq_length=1,
+    intra_seq_delimiter='#',
+):
+    """Return the dictionary encoding of unit sequences of a given length
+    (cf. Segmentation._intern()): an int array with the code of the sequence
+    starting at each position, and the list of distinct sequences in final
+    format (i.e. joined with intra_seq_delimiter) indexed by these codes, in
+    order of first occurrence.
+    """
+    unit_codes, unit_values = unit_segmentation._intern(unit_annotation_key)
+    if unit_seq_length == 1:
+        return unit_codes, list(unit_values)
+
+    # Code sequences position by position (codes are made dense again
+    # whenever they could overflow)...
+    num_unit_values = len(unit_values)
+    num_seqs = max(len(unit_codes) - (unit_seq_length - 1), 0)
+    seq_codes = unit_codes[:num_seqs].astype(np.int64)
+    max_seq_code = num_unit_values
+    for pos in range(1, unit_seq_length):
+        if max_seq_code * num_unit_values >= 2 ** 62:
+            distinct_seq_codes, seq_codes = np.unique(
+                seq_codes,
+                return_inverse=True,
+            )
+            seq_codes = seq_codes.reshape(-1)
+            max_seq_code = len(distinct_seq_codes)
+        seq_codes = (
+            seq_codes * num_unit_values + unit_codes[pos:pos + num_seqs]
+        )
+        max_seq_code *= num_unit_values
+
+    # Join each distinct sequence once, in order of first occurrence, and
+    # renumber codes accordingly (distinct sequences may yield the same
+    # string if units contain the delimiter)...
+    _, first_indices, seq_codes = np.unique(
+        seq_codes,
+        return_index=True,
+        return_inverse=True,
+    )
+    if unit_annotation_key is not None:
+        unit_list = unit_segmentation.get_annotation_values(
+            unit_annotation_key,
+        )
+    else:
+        unit_list = unit_segmentation.get_contents()
+    seq_join = intra_seq_delimiter.join
+    order = np.argsort(first_indices)
+    seq_types = [
+        seq_join(unit_list[index:index + unit_seq_length])
+        for index in first_indices[order].tolist()
+    ]
+    code_map = np.empty(len(seq_types), dtype=np.int64)
+    if len(set(seq_types)) == len(seq_types):
+        code_map[order] = np.arange(len(seq_types))
+    else:
+        # Merge colliding strings, listing distinct ones in code order
+        # (dict order is arbitrary in Python 2)...
+        seq_type_codes = dict()
+        distinct_seq_types = list()
+        for seq_type in seq_types:
+            if seq_type not in seq_type_codes:
+                seq_type_codes[seq_type] = len(distinct_seq_types)
+                distinct_seq_types.append(seq_type)
+        code_map[order] = [seq_type_codes[seq_type] for seq_type in seq_types]
+        seq_types = distinct_seq_types
+    return code_map[seq_codes.reshape(-1)], seq_types
+
+
+def _get_contained_sequence_indices_by_context(
+    context_segmentation,
+    unit_segmentation,
+    unit_seq_length=1,
+):
+    """Return, for each context segment, the list of indices of the first
+    position of unit sequences of a given length that are contained in it
+    (cf. Segment.get_contained_sequence_indices()), computed for all contexts
+    at once; return None if unit segments are not sorted by address.
+    """
+    unit_str_indices, unit_starts, unit_ends =  \
+        unit_segmentation._get_addresses()
+
+    # Sort keys combining str_index and start position...
+    unit_keys = (unit_str_indices << 32) + unit_starts
+    if np.any(unit_keys[1:] < unit_keys[:-1]):
+        return None
+
+    # Get the range of units starting within each context...
+    context_str_indices, context_starts, context_ends =  \
+        context_segmentation._get_addresses()
+    lows = np.searchsorted(
+        unit_keys,
+        (context_str_indices << 32) + context_starts,
+        side='left',
+    ).tolist()
+    highs = np.searchsorted(
+        unit_keys,
+        (context_str_indices << 32) + context_ends,
+        side='right',
+    ).tolist()
+
+    # Keep units (or sequences of units) ending within each context...
+    contained_indices = list()
+    for low, high, context_end in zip(lows, highs, context_ends.tolist()):
+        is_contained = unit_ends[low:high] <= context_end
+        if unit_seq_length > 1:
+            num_contained = np.concatenate(([0], np.cumsum(is_contained)))
+            is_contained = (
+                num_contained[unit_seq_length:] -
+                num_contained[:-unit_seq_length]
+                == unit_seq_length
+            )
+        contained_indices.append((np.flatnonzero(is_contained) + low).tolist())
+    return contained_indices
+
+
+def _get_contained_unit_counts(container_segmentation, unit_segmentation):
+    """Return a read-only array with the number of unit segments contained in
+    each segment of a container segmentation.
+
+    The result is cached with the container segmentation for the most recent
+    unit segmentation only, until either segmentation is modified, so that
+    repeated calls on the same pair of segmentations (e.g. with a different
+    window size) are not recomputed. The cache refers to the unit
+    segmentation through a weak reference to its cached addresses, so that
+    it keeps neither of them alive.
+    """
+    unit_str_indices = unit_segmentation._get_addresses()[0]
+    column_key = '__contained_unit_counts__'
+
+    def build_counts():
+        contained_indices = _get_contained_sequence_indices_by_context(
+            container_segmentation,
+            unit_segmentation,
+        )
+        if contained_indices is None:
+            contained_indices = (
+                container.get_contained_segment_indices(unit_segmentation)
+                for container in container_segmentation._iter_segments()
+            )
+        counts = np.fromiter(
+            (len(indices) for indices in contained_indices),
+            dtype=np.int64,
+            count=len(container_segmentation),
+        )
+        counts.flags.writeable = False
+        return weakref.ref(unit_str_indices), counts
+
+    # Rebuild counts if they were computed for another unit segmentation, or
+    # for the same one before it was modified (its addresses are rebuilt
+    # then)...
+    unit_ref, counts = container_segmentation._get_column(
+        column_key,
+        build_counts,
+    )
+    if unit_ref() is not unit_str_indices:
+        del container_segmentation._columns[column_key]
+        unit_ref, counts = container_segmentation._get_column(
+            column_key,
+            build_counts,
+        )
+    return counts
+
+
 def count_in_context(
     units=None,
     contexts=None,
@@ -87,7 +260,7 @@ def count_in_context(
         default_contexts.update(contexts)
     contexts = default_contexts
 
-    freq = dict()
+    freq = defaultdict(int)
     context_types = list()
     unit_types = list()
 
@@ -106,112 +279,97 @@ def count_in_context(
         unit_segmentation = units['segmentation']
         unit_annotation_key = units['annotation_key']
         unit_seq_length = units['seq_length']
-        seq_join = units['intra_seq_delimiter'].join
+
+        # Get the sequence of context types in final format (constant if
+        # contexts are merged)...
+        if contexts['merge']:
+            context_type_seq = repeat(context_type)
+        elif context_annotation_key is not None:
+            context_type_seq = context_segmentation.get_annotation_values(
+                context_annotation_key,
+            )
+        else:
+            context_type_seq = context_segmentation.get_contents()
 
         # CASE 1A: unit sequence length is greater than 1...
         if unit_seq_length > 1:
 
+            # Get the list of unit sequences in final format...
+            unit_seq_codes, unit_seq_types = _get_unit_seq_codes(
+                unit_segmentation,
+                unit_annotation_key,
+                unit_seq_length,
+                units['intra_seq_delimiter'],
+            )
+            unit_seq_list = list(
+                map(unit_seq_types.__getitem__, unit_seq_codes.tolist())
+            )
+
+            # Unmerged context types are stored even if they contain no
+            # unit sequence...
+            store_empty_contexts = not contexts['merge']
+
+        # CASE 1B: unit sequence length is 1...
+        else:
+
             # Get the list of units in final format...
             if unit_annotation_key is not None:
-                unit_list = [
-                    u.annotations.get(
-                        unit_annotation_key,
-                        '__none__',
-                    )
-                    for u in unit_segmentation
-                ]
+                unit_seq_list = unit_segmentation.get_annotation_values(
+                    unit_annotation_key,
+                )
             else:
-                unit_list = [u.get_content() for u in unit_segmentation]
-
-            # Loop over context token indices...
-            for context_index, context_segment in enumerate(
-                    context_segmentation):
-
-                # Get context token...
-                context_token = context_segment
-
-                # Get and store context type...
-                if not contexts['merge']:
-                    if context_annotation_key is not None:
-                        context_type = context_segment.annotations.get(
-                            context_annotation_key,
-                            u'__none__',
-                        )
-                    else:
-                        context_type = context_segment.get_content()
-
-                    if context_type not in context_types:
-                        context_types.append(context_type)
-
-                # Loop over contained unit sequences
-                for unit_seq_index in \
-                        context_token.get_contained_sequence_indices(
-                            unit_segmentation,
-                            unit_seq_length,
-                        ):
-
-                    # Get unit type...
-                    unit_type = seq_join(
-                        unit_list[unit_seq_index:unit_seq_index+unit_seq_length]
-                    )
+                unit_seq_list = unit_segmentation.get_contents()
 
-                    # Store unit type...
-                    if unit_type not in unit_types:
-                        unit_types.append(unit_type)
+            store_empty_contexts = False
 
-                    # Increment count of context-unit pair...
-                    type_pair = (context_type, unit_type)
-                    freq[type_pair] = freq.get(type_pair, 0) + 1
+        # Get the indices of unit sequences contained in each context, for
+        # all contexts at once (or context by context if unit segments are
+        # not sorted by address)...
+        contained_indices = _get_contained_sequence_indices_by_context(
+            context_segmentation,
+            unit_segmentation,
+            unit_seq_length,
+        )
+        if contained_indices is None:
+            contained_indices = (
+                context_token.get_contained_sequence_indices(
+                    unit_segmentation,
+                    unit_seq_length,
+                )
+                for context_token in context_segmentation
+            )
 
-                if progress_callback:
-                    progress_callback()
+        # Context and unit types are collected as OrderedDict keys (i.e. an
+        # insertion-ordered set)...
+        context_type_dict = OrderedDict()
+        unit_type_dict = OrderedDict()
 
-            # Store default context type if needed...
-            if len(freq) > 0 and len(context_types) == 0:
-                context_types.append(context_type)
+        # Loop over contexts...
+        for context_type, unit_seq_indices in zip(
+            context_type_seq,
+            contained_indices,
+        ):
 
-        # CASE 1B: unit sequence length is 1...
-        else:
+            # Count contained unit (sequence) types...
+            unit_seq = list(map(unit_seq_list.__getitem__, unit_seq_indices))
+            unit_freq = Counter(unit_seq)
 
-            # Loop over context tokens (=containing segments)
-            for context_token in contexts['segmentation']:
-
-                # Determine if context types are surface or annotations.
-                if not contexts['merge']:
-                    if context_annotation_key is not None:
-                        context_type = context_token.annotations.get(
-                            context_annotation_key,
-                            '__none__',  # Default annotation
-                        )
-                    else:
-                        context_type = context_token.get_content()
-
-                # Loop over unit tokens (=contained segments)
-                for unit_token in context_token.get_contained_segments(
-                    unit_segmentation
-                ):
+            # Store context type...
+            if unit_freq or store_empty_contexts:
+                context_type_dict[context_type] = None
 
-                    # Determine if unit types are surface or anno.
-                    if unit_annotation_key:
-                        unit_type = unit_token.annotations.get(
-                            unit_annotation_key,
-                            '__none__',  # Default annotation
-                        )
-                    else:
-                        unit_type = unit_token.get_content()
-
-                    # Store context and unit type...
-                    if context_type not in context_types:
-                        context_types.append(context_type)
-                    if unit_type not in unit_types:
-                        unit_types.append(unit_type)
-
-                    # Increment count of context-unit pair...
-                    type_pair = (context_type, unit_type)
-                    freq[type_pair] = freq.get(type_pair, 0) + 1
+            # Store unit types (in order of first occurrence, which Counter
+            # doesn't keep in Python 2) and increment counts of context-unit
+            # pairs...
+            for unit_type in OrderedDict.fromkeys(unit_seq):
+                unit_type_dict[unit_type] = None
+                freq[(context_type, unit_type)] += unit_freq[unit_type]
 
-                if progress_callback:
-                    progress_callback()
+            if progress_callback:
+                progress_callback()
+
+        context_types = list(context_type_dict)
+        unit_types = list(unit_type_dict)
 
     # CASE 2: no context segmentation is specified...
     elif units['segmentation'] is not None:
@@ -223,72 +381,54 @@ def count_in_context(
         # Optimization...
         unit_annotation_key = units['annotation_key']
         unit_segmentation = units['segmentation']
-        unit_segmentation_length = len(units['segmentation'])
         unit_seq_length = units['seq_length']
-        seq_join = units['intra_seq_delimiter'].join
 
         # CASE 2A: unit sequence length is greater than 1...
         if unit_seq_length > 1:
 
-            # Get the list of units in final format...
-            if unit_annotation_key is not None:
-                unit_list = [
-                    u.annotations.get(
-                        unit_annotation_key,
-                        '__none__',
-                    )
-                    for u in unit_segmentation
-                ]
-            else:
-                unit_list = [u.get_content() for u in unit_segmentation]
-
-            # Loop over unit sequences (=contained segments)
-            for unit_index in range(
-                unit_segmentation_length - (unit_seq_length - 1)
-            ):
+            # Get the dictionary-encoded unit sequences (unit types are in
+            # order of first occurrence)...
+            unit_seq_codes, unit_types = _get_unit_seq_codes(
+                unit_segmentation,
+                unit_annotation_key,
+                unit_seq_length,
+                units['intra_seq_delimiter'],
+            )
 
-                # Get unit type...
-                unit_type = seq_join(
-                    unit_list[unit_index: unit_index + unit_seq_length]
+            # Count unit sequences...
+            unit_seq_freq = np.bincount(
+                unit_seq_codes,
+                minlength=len(unit_types),
+            )
+            freq.update(
+                zip(
+                    zip(repeat(context_type), unit_types),
+                    unit_seq_freq.tolist(),
                 )
+            )
 
-                # Store unit type...
-                if unit_type not in unit_types:
-                    unit_types.append(unit_type)
-
-                # Increment count of context-unit pair...
-                type_pair = (context_type, unit_type)
-                freq[type_pair] = freq.get(type_pair, 0) + 1
-
-                if progress_callback:
+            if progress_callback:
+                for unit_index in range(len(unit_seq_codes)):
                     progress_callback()
 
         # CASE 2B: unit sequence length is 1...
         else:
 
-            # Get the list of units in final format...
-            if unit_annotation_key is not None:
-                unit_list = [
-                    u.annotations.get(
-                        unit_annotation_key,
-                        '__none__',
-                    )
-                    for u in unit_segmentation
-                ]
-            else:
-                unit_list = [u.get_content() for u in unit_segmentation]
-
-            # Get unit types...
-            unit_types = list(set(unit_list))
-
-            # Loop over unit tokens (=contained segments)
-            for unit_type in unit_list:
+            # Get the dictionary-encoded units (unit types are in order of
+            # first occurrence)...
+            unit_codes, unit_types = unit_segmentation._intern(
+                unit_annotation_key
+            )
+            unit_types = list(unit_types)
 
-                # Increment count of context-unit pair...
-                type_pair = (context_type, unit_type)
-                freq[type_pair] = freq.get(type_pair, 0) + 1
+            # Count unit tokens...
+            unit_freq = np.bincount(unit_codes, minlength=len(unit_types))
+            freq.update(
+                zip(zip(repeat(context_type), unit_types), unit_freq.tolist())
+            )
 
-                if progress_callback:
+            if progress_callback:
+                for unit_index in range(len(unit_codes)):
                     progress_callback()
 
     # Create pivot crosstab...
@@ -300,7 +440,7 @@ def count_in_context(
         IntPivotCrosstab(
             context_types,
             unit_types,
-            freq,
+            dict(freq),
             '__unit__',
             'string',
             '__context__',
@@ -342,7 +482,7 @@ def count_in_window(
 
     freq = dict()
     unit_types = list()
-    window_type = 1
+    window_types = ['1']
 
     if (
         units['segmentation'] is not None and
@@ -353,139 +493,74 @@ def count_in_window(
         unit_segmentation = units['segmentation']
         unit_annotation_key = units['annotation_key']
 
-        # Get the list of units in final format (content or annotation)...
-        if unit_annotation_key is not None:
-            unit_list = [
-                unit_token.annotations.get(
-                    unit_annotation_key,
-                    '__none__',  # Default annotation
-                )
-                for unit_token in unit_segmentation
-            ]
-        else:
-            unit_list = [u.get_content() for u in unit_segmentation]
-
-        # CASE 1: unit sequence length is greater than 1...
-        if units['seq_length'] > 1:
-
-            # Optimization...
-            seq_join = units['intra_seq_delimiter'].join
-            unit_seq_length = units['seq_length']
+        # Get unit (sequences) encoded as integers (in order of first
+        # occurrence)...
+        unit_seq_length = units['seq_length']
+        codes, unit_types = _get_unit_seq_codes(
+            unit_segmentation,
+            unit_annotation_key,
+            unit_seq_length,
+            units['intra_seq_delimiter'],
+        )
 
-            # Get counts for first window...
-            first_window = unit_list[:window_size]
-            window_freq = dict()
-            for unit_index in range(window_size - (unit_seq_length - 1)):
-                unit_type = seq_join(
-                    first_window[unit_index: unit_index + unit_seq_length]
-                )
-                if unit_type not in unit_types:
-                    unit_types.append(unit_type)
-                window_freq[unit_type] = window_freq.get(unit_type, 0) + 1
+        # Number of unit (sequences) in each window...
+        num_units_in_window = window_size - (unit_seq_length - 1)
 
-            # Update main counts...
-            freq = dict(
-                [(('1', k), v) for (k, v) in iteritems(window_freq)]
+        # Get counts for first window (types are coded in order of first
+        # occurrence, so the types seen so far are those whose code is
+        # lower than num_seen_types)...
+        window_freq = np.bincount(
+            codes[:num_units_in_window],
+            minlength=len(unit_types),
+        )
+        num_seen_types = int(codes[:num_units_in_window].max()) + 1
+
+        # Update main counts (pairs are fed straight to the dict, and zip
+        # stops after the last seen type so unit_types needn't be sliced)...
+        freq = dict(
+            zip(
+                zip(repeat(window_types[0]), unit_types),
+                window_freq[:num_seen_types].tolist(),
             )
+        )
 
-            if progress_callback:
-                progress_callback()
-
-            # Loop over other window indices...
-            for window_index in range(
-                1,
-                len(units['segmentation']) - (window_size - 1)
-            ):
+        if progress_callback:
+            progress_callback()
 
-                # Decrement count of first unit in previous window...
-                window_freq[
-                    seq_join(
-                        unit_list[window_index-1:window_index+unit_seq_length-1]
-                    )
-                ] -= 1
-
-                # Increment count of last unit in current window...
-                new_unit = seq_join(
-                    unit_list[
-                        window_index + window_size - unit_seq_length
-                        :
-                        window_index + window_size
-                    ]
-                )
-                window_freq[new_unit] = window_freq.get(new_unit, 0) + 1
-                if new_unit not in unit_types:
-                    unit_types.append(new_unit)
-
-                # Get window type...
-                window_type = window_index + 1
-                window_str = text(window_type)
-
-                # Update main counts...
-                freq.update(
-                    dict(
-                        [
-                            ((window_str, k), v)
-                            for (k, v) in iteritems(window_freq)
-                        ]
-                    )
-                )
+        # Loop over other window indices...
+        for window_index in range(
+            1,
+            len(codes) - (num_units_in_window - 1)
+        ):
 
-                if progress_callback:
-                    progress_callback()
+            # Decrement count of first unit in previous window...
+            window_freq[codes[window_index - 1]] -= 1
 
-        # CASE 2: unit sequence length is 1...
-        else:
+            # Increment count of last unit in current window...
+            new_code = codes[window_index + num_units_in_window - 1]
+            window_freq[new_code] += 1
+            if new_code >= num_seen_types:
+                num_seen_types = int(new_code) + 1
 
-            # Get unit types...
-            unit_types = list(set(unit_list))
-
-            # Get counts for first window...
-            first_window = unit_list[:window_size]
-            window_freq = dict()
-            for unit_token in first_window:
-                window_freq[unit_token] = window_freq.get(unit_token, 0) + 1
+            # Get window type...
+            window_str = text(window_index + 1)
+            window_types.append(window_str)
 
             # Update main counts...
-            freq = dict(
-                [(('1', k), v) for (k, v) in iteritems(window_freq)]
+            freq.update(
+                zip(
+                    zip(repeat(window_str), unit_types),
+                    window_freq[:num_seen_types].tolist(),
+                )
             )
 
             if progress_callback:
                 progress_callback()
 
-            # Loop over other window indices...
-            for window_index in range(
-                1,
-                len(units['segmentation']) - (window_size - 1)
-            ):
-
-                # Decrement count of first unit in previous window...
-                window_freq[unit_list[window_index - 1]] -= 1
-
-                # Increment count of last unit in current window...
-                new_unit = unit_list[window_index + window_size - 1]
-                window_freq[new_unit] = window_freq.get(new_unit, 0) + 1
-
-                # Get window type...
-                window_type = window_index + 1
-                window_str = text(window_type)
-                # Update main counts...
-                freq.update(
-                    dict(
-                        [
-                            ((window_str, k), v)
-                            for (k, v) in iteritems(window_freq)
-                        ]
-                    )
-                )
-
-                if progress_callback:
-                    progress_callback()
-
     # Create pivot crosstab...
     return (
         IntPivotCrosstab(
-            [text(i) for i in range(1, window_type + 1)],
+            window_types,
             unit_types,
             freq,
             '__unit__',
@@ -543,7 +618,7 @@ def count_in_chain(
         default_contexts.update(contexts)
     contexts = default_contexts
 
-    freq = dict()
+    freq = defaultdict(int)
     context_types = list()
     unit_types = list()
 
@@ -563,145 +638,116 @@ def count_in_chain(
         window_size <= len(unit_segmentation)
     ):
 
-        # Get the list of units in final format (content or annotation)...
+        # Get the integer code of each unit and the list of distinct units
+        # in final format (content or annotation, cast to text once per
+        # distinct annotation value)...
+        unit_codes, unit_values = unit_segmentation._intern(
+            unit_annotation_key
+        )
         if unit_annotation_key is not None:
-            unit_list = [
-               text(
-                    unit_token.annotations.get(
-                        unit_annotation_key,
-                        '__none__',  # Default annotation
-                    )
-                )
-                for unit_token in unit_segmentation
-            ]
-        else:
-            unit_list = [u.get_content() for u in unit_segmentation]
-
-        # Get the list of string indices...
-        str_indices = [s.get_real_str_index() for s in unit_segmentation]
-
-        # CASE 1: unit sequence length is greater than 1...
-        if unit_seq_length > 1:
-
-            # Loop over window indices...
-            for window_index in range(
-                len(units['segmentation']) - (window_size - 1)
-            ):
+            unit_values = [text(value) for value in unit_values]
 
-                # Pass unless merges_strings is True or all str_indices in
-                # this window are equal...
-                idx_sequence = str_indices[
-                    window_index : window_index + window_size
-                ]
-                if(
-                    not merge_strings and
-                    idx_sequence.count(idx_sequence[0]) != len(idx_sequence)
-                ):
-                    if progress_callback:
-                        progress_callback()
-                    continue
-
-                # Get context type...
-                context_type = '%s%s%s' % (
-                    seq_join(
-                        unit_list[window_index:window_index+context_left_size]
-                    ),
-                    unit_pos_marker,
-                    seq_join(
-                        unit_list[
-                             window_index + context_left_size + unit_seq_length:
-                             window_index + window_size
-                        ]
-                    )
-                )
-
-                # Get unit type...
-                unit_type = seq_join(
-                    unit_list[
-                        window_index + context_left_size
-                        :
-                        window_index + context_left_size + unit_seq_length
-                    ]
-                )
-
-                # Store context and unit type...
-                if context_type not in context_types:
-                    context_types.append(context_type)
-                if unit_type not in unit_types:
-                    unit_types.append(unit_type)
+        # Get the array of string indices...
+        str_indices = np.array(unit_segmentation._get_real_str_indices())
 
-                # Increment count of context-unit pair...
-                type_pair = (context_type, unit_type)
-                freq[type_pair] = freq.get(type_pair, 0) + 1
+        # Get the array of windows as rows of unit codes...
+        num_windows = len(unit_codes) - (window_size - 1)
+        windows = np.stack(
+            [unit_codes[pos:pos + num_windows] for pos in range(window_size)],
+            axis=1,
+        )
 
-                if progress_callback:
-                    progress_callback()
+        # Keep only windows whose str_indices are all equal (unless
+        # merge_strings is True): a window is kept iff the number of string
+        # changes is the same at its first and last position...
+        if not merge_strings:
+            num_string_changes = np.concatenate(
+                ([0], np.cumsum(str_indices[1:] != str_indices[:-1]))
+            )
+            windows = windows[
+                num_string_changes[window_size - 1:]
+                == num_string_changes[:num_windows]
+            ]
 
-        # CASE 2: unit sequence length is 1...
+        # Count distinct windows, in order of first occurrence (windows are
+        # compared as single integers if their codes fit in 62 bits)...
+        num_values = max(len(unit_values), 2)
+        if num_values ** window_size < 2 ** 62:
+            window_keys = np.zeros(len(windows), dtype=np.int64)
+            for pos in range(window_size):
+                window_keys *= num_values
+                window_keys += windows[:, pos]
+            _, first_indices, window_counts = np.unique(
+                window_keys,
+                return_index=True,
+                return_counts=True,
+            )
         else:
-
-            # Get unit types...
-            unit_types = list(
-                set(
-                    unit_list[
-                        context_left_size:
-                        len(units['segmentation']) - context_right_size
-                    ]
-                )
+            _, first_indices, window_counts = np.unique(
+                windows,
+                axis=0,
+                return_index=True,
+                return_counts=True,
             )
+        order = np.argsort(first_indices, kind='stable')
+        windows = windows[first_indices[order]]
+        window_counts = window_counts[order].tolist()
+        windows = zip(*[
+            list(map(unit_values.__getitem__, windows[:, pos].tolist()))
+            for pos in range(window_size)
+        ])
+
+        # Context and unit types are collected as OrderedDict keys (i.e. an
+        # insertion-ordered set). If unit sequence length is 1, unit types
+        # are all units that may occur in the middle of a window (whether
+        # or not it is kept)...
+        context_type_dict = OrderedDict()
+        if unit_seq_length == 1:
+            middle_codes, middle_first_indices = np.unique(
+                unit_codes[context_left_size:num_windows + context_left_size],
+                return_index=True,
+            )
+            unit_type_dict = OrderedDict.fromkeys(
+                unit_values[code] for code in
+                middle_codes[np.argsort(middle_first_indices)].tolist()
+            )
+        else:
+            unit_type_dict = OrderedDict()
 
-            # Loop over window indices...
-            for window_index in range(
-                len(units['segmentation']) - (window_size - 1)
-            ):
+        # Loop over distinct windows...
+        unit_end = context_left_size + unit_seq_length
+        for window, count in zip(windows, window_counts):
 
-                # Pass unless merges_strings is True or all str_indices in
-                # this window are equal...
-                idx_sequence = str_indices[
-                    window_index : window_index + window_size
-                ]
-                if(
-                    not merge_strings and
-                    idx_sequence.count(idx_sequence[0]) != len(idx_sequence)
-                ):
-                    if progress_callback:
-                        progress_callback()
-                    continue
-
-                # Get context type...
-                context_type = '%s%s%s' % (
-                    seq_join(
-                        unit_list[window_index:window_index+context_left_size]
-                    ),
-                    unit_pos_marker,
-                    seq_join(
-                        unit_list[
-                            window_index + context_left_size + 1:
-                            window_index + window_size
-                        ]
-                    )
-                )
+            # Get context type...
+            context_type = '%s%s%s' % (
+                seq_join(window[:context_left_size]),
+                unit_pos_marker,
+                seq_join(window[unit_end:]),
+            )
 
-                # Get unit type...
-                unit_type = unit_list[window_index + context_left_size]
+            # Get unit type...
+            unit_type = seq_join(window[context_left_size:unit_end])
 
-                # Store context and unit type...
-                if context_type not in context_types:
-                    context_types.append(context_type)
+            # Store context and unit type...
+            context_type_dict[context_type] = None
+            unit_type_dict[unit_type] = None
 
-                # Increment count of context-unit pair...
-                type_pair = (context_type, unit_type)
-                freq[type_pair] = freq.get(type_pair, 0) + 1
+            # Increment count of context-unit pair...
+            freq[(context_type, unit_type)] += count
 
-                if progress_callback:
-                    progress_callback()
+        context_types = list(context_type_dict)
+        unit_types = list(unit_type_dict)
+
+        if progress_callback:
+            for window_index in range(num_windows):
+                progress_callback()
 
     # Create pivot crosstab...
     return (
         IntPivotCrosstab(
             context_types,
             unit_types,
-            freq,
+            dict(freq),
             '__unit__',
             'string',
             '__context__',
@@ -733,10 +779,6 @@ def length_in_context(
     annotation_key          annotation to be used           None
     merge                   merge contexts together?        False
 
-    NB: When some form of averaging is performed with large segmentations,
-    execution can be *dramatically* slower if standard deviation is
-    computed.
-
     Returns a Table.
     """
 
@@ -758,7 +800,16 @@ def length_in_context(
 
     values = dict()
     context_types = list()
-    col_ids = list()
+
+    # Get col ids...
+    if averaging['segmentation'] is not None:
+        length_col_name = '__length_average__'
+        col_ids = [length_col_name, '__length_count__']
+        if averaging['std_deviation']:
+            col_ids.append('__length_std_deviation__')
+    else:
+        length_col_name = '__length__'
+        col_ids = [length_col_name]
 
     # CASE 1: context segmentation is specified...
     if contexts['segmentation'] is not None and units is not None:
@@ -772,114 +823,91 @@ def length_in_context(
 
             # Set default context type.
             context_types = ['__global__']
+            context_codes = [0] * len(context_segmentation)
 
-        # Else get the list of contexts in final format...
+        # Else get the index of each context's type (in order of first
+        # occurrence)...
         else:
-            if context_annotation_key is not None:
-                context_list = [
-                    c.annotations.get(
-                        context_annotation_key,
-                        '__none__',
-                    )
-                    for c in context_segmentation if c.annotations is not None
-                ]
-            else:
-                context_list = [
-                    c.get_content() for c in context_segmentation if
-                    c is not None
-                ]
+            context_codes, context_types = context_segmentation._intern(
+                context_annotation_key,
+            )
+            context_codes = context_codes.tolist()
+            context_types = list(context_types)
 
         # CASE 1A: averaging units are specified...
         if averaging['segmentation'] is not None:
 
-            lengths = dict()
-            
-            # Loop over context token indices...
-            for context_index, context_segment in enumerate(
-                contexts['segmentation']
-            ):
-
-                # Get context token...
-                context_token = context_segment
+            averaging_segmentation = averaging['segmentation']
 
-                # Get and store context type...
-                if contexts['merge']:
-                    context_type = '__global__'
-                else:
-                    context_type = context_list[context_index]
-                    if context_type not in context_types:
-                        context_types.append(context_type)
+            # Get the number of units in each averaging unit, computed only
+            # once per averaging unit (even if several contexts contain it)...
+            averaging_unit_lengths = _get_contained_unit_counts(
+                averaging_segmentation,
+                units,
+            )
 
-                # Get averaging units for this context token...
-                averaging_units = context_token.get_contained_segments(
-                    averaging['segmentation']
+            # Get indices of averaging units in each context token...
+            contained_indices = _get_contained_sequence_indices_by_context(
+                context_segmentation,
+                averaging_segmentation,
+            )
+            if contained_indices is None:
+                contained_indices = (
+                    context_token.get_contained_segment_indices(
+                        averaging_segmentation
+                    )
+                    for context_token in context_segmentation._iter_segments()
                 )
 
-                # Get lengths for these averaging units and store with type...
-                my_lengths = [
-                    len(averaging_unit.get_contained_segments(units))
-                    for averaging_unit in averaging_units
-                ]              
-                try:
-                    lengths[context_type].extend(my_lengths)
-                except KeyError:
-                    lengths[context_type] = my_lengths
-                    
+            # Gather averaging unit indices by context type...
+            averaging_indices = [list() for _ in context_types]
+            for indices, context_code in zip(contained_indices, context_codes):
+                averaging_indices[context_code].extend(indices)
                 if progress_callback:
                     progress_callback()
-            print(lengths)
+
             # Loop over context types...
-            for context_type in context_types:
+            for context_type, indices in zip(context_types, averaging_indices):
+
+                # Compute average and standard deviation (NaN if there are
+                # no averaging units in this context)...
+                if indices:
+                    context_lengths = averaging_unit_lengths[indices]
+                    average = context_lengths.mean()
+                    std_deviation = context_lengths.std()
+                else:
+                    average = std_deviation = float('nan')
 
                 # Store average and count for this context...
-                values[context_type, '__length_average__'] = np.mean(
-                    lengths[context_type]
-                )
-                values[context_type, '__length_count__'] = len(
-                    lengths[context_type]
-                )
+                values[context_type, '__length_average__'] = float(average)
+                values[context_type, '__length_count__'] = len(indices)
 
                 # If standard deviation should be computed...
                 if averaging['std_deviation']:
                     values[context_type, '__length_std_deviation__'] =    \
-                        np.std(lengths[context_type])
-
-            # Store col ids...
-            if len(values) > 0:
-                col_ids.append('__length_average__')
-                col_ids.append('__length_count__')
-                if averaging['std_deviation']:
-                    col_ids.append('__length_std_deviation__')
+                        float(std_deviation)
 
         # CASE 1B: no averaging units are specified...
         else:
 
-            # Loop over context token indices...
-            for context_index, context_segment in enumerate(
-                    contexts['segmentation']):
+            lengths = [0] * len(context_types)
 
-                # Get context token...
-                context_token = context_segment
-
-                # Get and store context type...
-                if not contexts['merge']:
-                    context_type = context_list[context_index]
-                    if context_type not in context_types:
-                        context_types.append(context_type)
+            # Loop over context token lengths and type indices...
+            for context_length, context_code in zip(
+                _get_contained_unit_counts(context_segmentation, units)
+                .tolist(),
+                context_codes,
+            ):
 
-                # Increment length for this context...
-                values[(context_type, '__length__')] = values.get(
-                    (context_type, '__length__'), 0
-                ) + len(
-                    context_token.get_contained_segments(units)
-                )
+                # Increment length for this context type...
+                lengths[context_code] += context_length
 
                 if progress_callback:
                     progress_callback()
 
-            # Store col ids...
-            if len(values) > 0:
-                col_ids.append('__length__')
+            # Store length of each context type...
+            for context_type, length in zip(context_types, lengths):
+                values[(context_type, '__length__')] = length
 
     # CASE 2: context segmentation is not specified...
     elif units is not None:
@@ -891,25 +919,26 @@ def length_in_context(
             context_type = '__global__'
             context_types.append(context_type)
 
-            lengths = [
-                len(averaging_unit.get_contained_segments(units))
-                for averaging_unit in averaging['segmentation']
-            ]
-            
-            values[context_type, '__length_average__'] = np.mean(lengths)
-            values[context_type, '__length_count__'] = len(lengths)
-            
+            lengths = _get_contained_unit_counts(
+                averaging['segmentation'],
+                units,
+            )
+
+            # Compute average and standard deviation (NaN if there are
+            # no averaging units)...
+            if lengths.size:
+                average = lengths.mean()
+                std_deviation = lengths.std()
+            else:
+                average = std_deviation = float('nan')
+
+            values[context_type, '__length_average__'] = float(average)
+            values[context_type, '__length_count__'] = lengths.size
+
             # If standard deviation should be computed...
             if averaging['std_deviation']:
                 values[context_type, '__length_std_deviation__'] =    \
-                    np.std(lengths)
-
-            # Store col ids...
-            if len(values) > 0:
-                col_ids.append('__length_average__')
-                col_ids.append('__length_count__')
-                if averaging['std_deviation']:
-                    col_ids.append('__length_std_deviation__')
+                    float(std_deviation)
 
         # CASE 2B: no averaging units are specified...
         else:
@@ -921,31 +950,24 @@ def length_in_context(
             # Get length...
             values[(context_type, '__length__')] = len(units)
 
-            # Store col ids...
-            if len(values) > 0:
-                col_ids.append('__length__')
-
     # Store default context type if needed...
     if len(values) > 0 and len(context_types) == 0:
         context_types.append(context_type)
 
+    # Drop col ids if no value was computed...
+    if len(values) == 0:
+        col_ids = list()
+
     # Remove zero-length contexts...
-    if averaging['segmentation'] is not None:
-        length_col_name = '__length_average__'
-    else:
-        length_col_name = '__length__'
-    context_types[:] = [
-        c for c in context_types
-        if (
-            (c, length_col_name) in values and
-            values[(c, length_col_name)]
-        )
+    kept_context_types = [
+        c for c in context_types if values.get((c, length_col_name))
     ]
-    values = dict(
-        (key, value)
-        for key, value in iteritems(values)
-        if key[0] in context_types
-    )
+    if len(kept_context_types) < len(context_types):
+        removed_context_types = set(context_types)
+        removed_context_types.difference_update(kept_context_types)
+        for key in [k for k in values if k[0] in removed_context_types]:
+            del values[key]
+        context_types[:] = kept_context_types
 
     # Create Table...
     if len(context_types) and isinstance(context_types[0], int):
@@ -982,10 +1004,6 @@ def length_in_window(
     segmentation            averaging unit segmentation     None
     std_deviation           compute standard deviation      False
 
-    NB: When some form of averaging is performed with large segmentations,
-    execution can be dramatically slower if standard deviation is
-    computed.
-
     Returns a Table.
     """
 
@@ -999,6 +1017,7 @@ def length_in_window(
 
     values = dict()
     window_type = 0
+    window_strs = list()
     col_ids = list()
 
     if (
@@ -1007,132 +1026,73 @@ def length_in_window(
         window_size <= len(averaging['segmentation'])
     ):
 
+        # Get col ids...
+        col_ids.append('__length_average__')
+        if averaging['std_deviation']:
+            col_ids.append('__length_std_deviation__')
+        col_ids.append('__length_count__')
+
         # Optimization...
         averaging_segmentation = averaging['segmentation']
 
-        # CASE 1: standard deviation must be computed...
-        if averaging['std_deviation']:
+        # Get the number of units in each averaging unit...
+        lengths = _get_contained_unit_counts(averaging_segmentation, units)
 
-            # Get lengths for first window...
-            lengths = [
-                len(a.get_contained_segments(units))
-                for a in averaging_segmentation[:window_size]
-            ]
+        # Compute sums of lengths in all windows at once...
+        cumulated_lengths = np.concatenate(([0], np.cumsum(lengths)))
+        sums = (
+            cumulated_lengths[window_size:] -
+            cumulated_lengths[:-window_size]
+        )
+        averages = sums / window_size
+        window_type = len(sums)
+        window_strs = [text(i) for i in range(1, window_type + 1)]
 
-            # Compute and store average and standard deviation...
-            sum_values = sum(lengths)
-            sum_squares = sum(l * l for l in lengths)
-            average = sum_values / window_size
-            stdev = math.sqrt(sum_squares / window_size - average * average)
-            window_type = 1
-            values[('1', '__length_average__')] = average
-            values[('1', '__length_std_deviation__')] = stdev
-            values[('1', '__length_count__')] = window_size
+        # CASE 1: standard deviation must be computed...
+        if averaging['std_deviation']:
 
-            if progress_callback:
-                progress_callback()
+            # Compute sums of squared lengths in all windows at once...
+            cumulated_squares = np.concatenate(
+                ([0], np.cumsum(lengths * lengths))
+            )
+            sum_squares = (
+                cumulated_squares[window_size:] -
+                cumulated_squares[:-window_size]
+            )
+            # Compute standard deviations (the variance numerator is
+            # computed exactly with integers rather than as a difference
+            # of rounded floats, which would suffer from cancellation)...
+            stdevs = np.sqrt(
+                (window_size * sum_squares - sums * sums) /
+                (window_size * window_size)
+            )
 
-            # Loop over other window indices...
-            for window_index in range(
-                1, len(averaging_segmentation) - (window_size - 1)
+            # Store averages and standard deviations...
+            for window_str, average, stdev in zip(
+                window_strs,
+                averages.tolist(),
+                stdevs.tolist(),
             ):
-
-                # Get window type...
-                window_type = window_index + 1
-
-                # Remove first length of window and decrement sums...
-                removed_length = lengths.pop(0)
-                sum_values -= removed_length
-                sum_squares -= removed_length * removed_length
-
-                # Get length of new averaging unit...
-                added_length = len(
-                    averaging_segmentation[
-                        window_index + window_size - 1
-                    ].get_contained_segments(units)
-                )
-
-                # Add new length to window and increment sums...
-                lengths.append(added_length)
-                sum_values += added_length
-                sum_squares += added_length * added_length
-
-                # Compute and store average and standard deviation...
-                average = sum_values / window_size
-                stdev = math.sqrt(
-                    sum_squares / window_size -
-                    average * average
-                )
-                window_str = text(window_type)
                 values[(window_str, '__length_average__')] = average
                 values[(window_str, '__length_std_deviation__')] = stdev
                 values[(window_str, '__length_count__')] = window_size
 
-                if progress_callback:
-                    progress_callback()
-
         # CASE 2: standard deviation need not be computed......
         else:
 
-            # Get lengths for first window...
-            lengths = [
-                len(a.get_contained_segments(units))
-                for a in averaging_segmentation[:window_size]
-            ]
-
-            # Compute and store average...
-            sum_values = sum(lengths)
-            average = sum_values / window_size
-            window_type = 1
-            values[('1', '__length_average__')] = average
-            values[('1', '__length_count__')] = window_size
-
-            if progress_callback:
-                progress_callback()
-
-            # Loop over other window indices...
-            for window_index in range(
-                1, len(averaging_segmentation) - (window_size - 1)
-            ):
-
-                # Get window type...
-                window_type = window_index + 1
-
-                # Remove first length of window and decrement sums...
-                removed_length = lengths.pop(0)
-                sum_values -= removed_length
-
-                # Get length of new averaging unit...
-                added_length = len(
-                    averaging_segmentation[
-                        window_index + window_size - 1
-                    ].get_contained_segments(units)
-                )
-
-                # Add new length to window and increment sums...
-                lengths.append(added_length)
-                sum_values += added_length
-
-                # Compute and store average and standard deviation...
-                average = sum_values / window_size
-                window_str = text(window_type)
+            # Store averages...
+            for window_str, average in zip(window_strs, averages.tolist()):
                 values[(window_str, '__length_average__')] = average
                 values[(window_str, '__length_count__')] = window_size
 
-                if progress_callback:
-                    progress_callback()
-
-        # Store col ids...
-        if len(values) > 0:
-            col_ids.append('__length_average__')
-            if averaging['std_deviation']:
-                col_ids.append('__length_std_deviation__')
-            col_ids.append('__length_count__')
+        if progress_callback:
+            for window_index in range(window_type):
+                progress_callback()
 
     # Create Table...
     return (
         Table(
-            [text(i) for i in range(1, window_type + 1)],
+            window_strs,
             col_ids,
             values,
             '__col__',
@@ -1147,6 +1107,20 @@ def length_in_window(
     )
 
 
+def _get_category_rows(rows, category_delimiter):
+    """Take per-row counts of units prepended with their category (cf.
+    prepend_unit_with_category()) and return per-row counts of categories.
+    """
+    category_rows = dict()
+    for row_id, row in iteritems(rows):
+        category_row = dict()
+        for unit, count in iteritems(row):
+            category = unit.split(category_delimiter, 1)[0]
+            category_row[category] = category_row.get(category, 0) + count
+        category_rows[row_id] = category_row
+    return category_rows
+
+
 def variety_in_context(
     units=None,
     categories=None,
@@ -1241,19 +1215,26 @@ def variety_in_context(
             progress_callback,
         )
         if apply_resampling and categories['adjust']:
-            category_counts = count_in_context(
-                {
-                    'segmentation': units['segmentation'],
-                    'annotation_key': categories['annotation_key'],
-                    'seq_length': units['seq_length'],
-                },
-                contexts,
-                progress_callback,
+
+            # Sum unit counts by category (units are not sequences here,
+            # so their category prefix can be split off)...
+            category_rows = _get_category_rows(
+                tuple_to_simple_dicts(counts.values),
+                category_delimiter,
             )
+            if progress_callback:
+                num_ticks = (
+                    len(contexts['segmentation'])
+                    if contexts['segmentation'] is not None
+                    else len(units['segmentation'])
+                )
+                for tick_index in range(num_ticks):
+                    progress_callback()
+
             # Compute target lexematic diversity (for RMSP)...
             expected_varieties = list()
-            for row_id in category_counts.row_ids:
-                row = tuple_to_simple_dict(category_counts.values, row_id)
+            for row_id in counts.row_ids:
+                row = category_rows.get(row_id, dict())
                 try:
                     expected_varieties.append(
                         get_expected_subsample_variety(row, subsample_size)
@@ -1281,8 +1262,9 @@ def variety_in_context(
         default_row_id = '__global__'
     else:
         default_row_id = None
+    rows = tuple_to_simple_dicts(counts.values)
     for row_id in counts.row_ids:
-        row = tuple_to_simple_dict(counts.values, row_id)
+        row = rows.get(row_id, dict())
         if default_row_id is not None:
             row_id = default_row_id
         if apply_resampling:
@@ -1291,28 +1273,26 @@ def variety_in_context(
 
                 if categories["adjust"]:
                     # Find optimal subsample size (RMSP)...
-                    cat_row = tuple_to_simple_dict(
-                        category_counts.values,
-                        row_id,
-                    )
+                    cat_row = category_rows.get(row_id, dict())
+                    cat_freqs = _get_frequency_array(cat_row)
                     if subsample_size > sum(cat_row.values()):
                         continue
                     size_low, size_high = 2, subsample_size
                     size_tmp = size_high
-                    NLTTR_tmp = get_expected_subsample_variety(
-                        cat_row,
+                    NLTTR_tmp = _get_expected_subsample_variety(
+                        cat_freqs,
                         size_tmp,
                     ) / size_tmp
                     while(True):
                         if NLTTR_tmp == target_NLTTR or size_low == size_high:
                             break
                         if size_high - size_low == 1:
-                            high = get_expected_subsample_variety(
-                                cat_row,
+                            high = _get_expected_subsample_variety(
+                                cat_freqs,
                                 size_high,
                             ) / size_high
-                            low = get_expected_subsample_variety(
-                                cat_row,
+                            low = _get_expected_subsample_variety(
+                                cat_freqs,
                                 size_low,
                             ) / size_low
                             if high - target_NLTTR < target_NLTTR - low:
@@ -1321,8 +1301,8 @@ def variety_in_context(
                                 size_tmp = size_low
                             break
                         size_tmp = iround((size_low+size_high) / 2)
-                        NLTTR_tmp = get_expected_subsample_variety(
-                            cat_row,
+                        NLTTR_tmp = _get_expected_subsample_variety(
+                            cat_freqs,
                             size_tmp,
                         ) / size_tmp
                         if NLTTR_tmp < target_NLTTR:
@@ -1331,20 +1311,14 @@ def variety_in_context(
                             size_low = size_tmp
                 else:
                     size_tmp = subsample_size
-                varieties = list()
-                for i in range(num_subsamples):
-                    try:
-                        sampled_row = sample_dict(row, size_tmp)
-                        varieties.append(
-                            get_variety(
-                                sampled_row,
-                                unit_weighting=units['weighting'],
-                                category_weighting=categories['weighting'],
-                                category_delimiter=category_delimiter,
-                            )
-                        )
-                    except ValueError:
-                        break
+                varieties = _get_subsample_varieties(
+                    row,
+                    size_tmp,
+                    num_subsamples,
+                    unit_weighting=units['weighting'],
+                    category_weighting=categories['weighting'],
+                    category_delimiter=category_delimiter,
+                )
                 if varieties:
                     (
                         new_values[(row_id, '__variety_average__')],
@@ -1356,20 +1330,14 @@ def variety_in_context(
 
             elif units['weighting']:
 
-                varieties = list()
-                for i in range(num_subsamples):
-                    try:
-                        sampled_row = sample_dict(row, subsample_size)
-                        varieties.append(
-                            get_variety(
-                                sampled_row,
-                                unit_weighting=units['weighting'],
-                                category_weighting=categories['weighting'],
-                                category_delimiter=category_delimiter,
-                            )
-                        )
-                    except ValueError:
-                        break
+                varieties = _get_subsample_varieties(
+                    row,
+                    subsample_size,
+                    num_subsamples,
+                    unit_weighting=units['weighting'],
+                    category_weighting=categories['weighting'],
+                    category_delimiter=category_delimiter,
+                )
                 if varieties:
                     (
                         new_values[(row_id, '__variety_average__')],
@@ -1516,19 +1484,22 @@ def variety_in_window(
             progress_callback,
         )
         if apply_resampling and categories['adjust']:
-            category_counts = count_in_window(
-                {
-                    'segmentation': units['segmentation'],
-                    'annotation_key': categories['annotation_key'],
-                    'seq_length': units['seq_length'],
-                },
-                window_size,
-                progress_callback,
+
+            # Sum unit counts by category (units are not sequences here,
+            # so their category prefix can be split off)...
+            category_rows = _get_category_rows(
+                tuple_to_simple_dicts(counts.values),
+                category_delimiter,
             )
+            if progress_callback:
+                num_ticks = len(counts.row_ids)
+                for tick_index in range(num_ticks):
+                    progress_callback()
+
             # Compute target lexematic diversity (for RMSP)...
             expected_varieties = list()
-            for row_id in category_counts.row_ids:
-                row = tuple_to_simple_dict(category_counts.values, row_id)
+            for row_id in counts.row_ids:
+                row = category_rows.get(row_id, dict())
                 try:
                     expected_varieties.append(
                         get_expected_subsample_variety(row, subsample_size)
@@ -1549,35 +1520,34 @@ def variety_in_window(
 
     # Compute varieties...
     new_values = dict()
+    rows = tuple_to_simple_dicts(counts.values)
     for row_id in counts.row_ids:
-        row = tuple_to_simple_dict(counts.values, row_id)
+        row = rows.get(row_id, dict())
         if apply_resampling:
             if measure_per_category:
 
                 if categories["adjust"]:
                     # Find optimal subsample size (RMSP)...
-                    cat_row = tuple_to_simple_dict(
-                        category_counts.values,
-                        row_id,
-                    )
+                    cat_row = category_rows.get(row_id, dict())
+                    cat_freqs = _get_frequency_array(cat_row)
                     if subsample_size > sum(cat_row.values()):
                         continue
                     size_low, size_high = 2, subsample_size
                     size_tmp = size_high
-                    NLTTR_tmp = get_expected_subsample_variety(
-                        cat_row,
+                    NLTTR_tmp = _get_expected_subsample_variety(
+                        cat_freqs,
                         size_tmp,
                     ) / size_tmp
                     while(True):
                         if NLTTR_tmp == target_NLTTR or size_low == size_high:
                             break
                         if size_high - size_low == 1:
-                            high = get_expected_subsample_variety(
-                                cat_row,
+                            high = _get_expected_subsample_variety(
+                                cat_freqs,
                                 size_high,
                             ) / size_high
-                            low = get_expected_subsample_variety(
-                                cat_row,
+                            low = _get_expected_subsample_variety(
+                                cat_freqs,
                                 size_low,
                             ) / size_low
                             if high - target_NLTTR < target_NLTTR - low:
@@ -1586,8 +1556,8 @@ def variety_in_window(
                                 size_tmp = size_low
                             break
                         size_tmp = iround((size_low+size_high) / 2)
-                        NLTTR_tmp = get_expected_subsample_variety(
-                            cat_row,
+                        NLTTR_tmp = _get_expected_subsample_variety(
+                            cat_freqs,
                             size_tmp,
                         ) / size_tmp
                         if NLTTR_tmp < target_NLTTR:
@@ -1597,20 +1567,14 @@ def variety_in_window(
                 else:
                     size_tmp = subsample_size
 
-                varieties = list()
-                for i in range(num_subsamples):
-                    try:
-                        sampled_row = sample_dict(row, size_tmp)
-                        varieties.append(
-                            get_variety(
-                                sampled_row,
-                                unit_weighting=units['weighting'],
-                                category_weighting=categories['weighting'],
-                                category_delimiter=category_delimiter,
-                            )
-                        )
-                    except ValueError:
-                        break
+                varieties = _get_subsample_varieties(
+                    row,
+                    size_tmp,
+                    num_subsamples,
+                    unit_weighting=units['weighting'],
+                    category_weighting=categories['weighting'],
+                    category_delimiter=category_delimiter,
+                )
                 if varieties:
                     (
                         new_values[(row_id, '__variety_average__')],
@@ -1621,20 +1585,14 @@ def variety_in_window(
 
             elif units['weighting']:
 
-                varieties = list()
-                for i in range(num_subsamples):
-                    try:
-                        sampled_row = sample_dict(row, subsample_size)
-                        varieties.append(
-                            get_variety(
-                                sampled_row,
-                                unit_weighting=units['weighting'],
-                                category_weighting=categories['weighting'],
-                                category_delimiter=category_delimiter,
-                            )
-                        )
-                    except ValueError:
-                        break
+                varieties = _get_subsample_varieties(
+                    row,
+                    subsample_size,
+                    num_subsamples,
+                    unit_weighting=units['weighting'],
+                    category_weighting=categories['weighting'],
+                    category_delimiter=category_delimiter,
+                )
                 if varieties:
                     (
                         new_values[(row_id, '__variety_average__')],
@@ -1761,8 +1719,27 @@ def annotate_contexts(
     )
 
     new_values = dict()
+    rows = tuple_to_simple_dicts(counts.values)
     for row_id in counts.row_ids:
-        row = tuple_to_simple_dict(counts.values, row_id)
+        row = rows.get(row_id, dict())
+
+        # If only the first annotation is needed, get it without sorting
+        # (max() and min() return the first of equal items, like the
+        # stable sort)...
+        if multiple_values['keep_only_first'] and row:
+            if multiple_values['reverse']:
+                select = max
+            else:
+                select = min
+            if multiple_values['sort_order'] == 'Frequency':
+                new_values[(row_id, '__annotation__')] = select(
+                    row,
+                    key=row.__getitem__,
+                )
+            elif multiple_values['sort_order'] == 'ASCII':
+                new_values[(row_id, '__annotation__')] = select(row)
+            continue
+
         if multiple_values['sort_order'] == 'Frequency':
             annotations = sorted(
                 row,
@@ -1848,32 +1825,58 @@ def context(
     # Optimization...
     unit_segmentation = units['segmentation']
     unit_annotation_key = units['annotation_key']
+    separate_annotation = units['separate_annotation']
     context_segmentation = contexts['segmentation']
     context_annotation_key = contexts['annotation_key']
     max_num_chars = contexts['max_num_chars']
+    get_data = Segmentation.get_data
 
-    # Loop over context token indices...
-    for context_index, context_segment in enumerate(context_segmentation):
+    # Get unit addresses, contents and annotations once...
+    unit_starts, unit_ends = (
+        column.tolist() for column in unit_segmentation._get_addresses()[1:]
+    )
+    unit_contents = unit_segmentation.get_contents()
+    if unit_annotation_key is not None:
+        unit_annotations = unit_segmentation.get_annotation_values(
+            unit_annotation_key,
+        )
 
-        # Get context token and annotation...
-        context_token = context_segment
+    # Get indices of units in each context token...
+    contained_indices = _get_contained_sequence_indices_by_context(
+        context_segmentation,
+        unit_segmentation,
+    )
+    if contained_indices is None:
+        contained_indices = (
+            context_token.get_contained_segment_indices(unit_segmentation)
+            for context_token in context_segmentation._iter_segments()
+        )
+
+    # Loop over context tokens...
+    for context_index, (context_token, unit_indices) in enumerate(
+        zip(context_segmentation._iter_segments(), contained_indices)
+    ):
+
+        # Get context annotation...
         if context_annotation_key is not None:
             context_annotation = context_token.annotations.get(
                 context_annotation_key,
                 '__none__',
             )
 
+        # Get context address and string (which contained units share)...
+        context_string = get_data(context_token.str_index)
+        context_start = context_token.start or 0
+        context_end = context_token.end or len(context_string)
+
         # Set max_len
         if max_num_chars is None:
-            max_len = len(context_token.get_content())
+            max_len = context_end - context_start
         else:
             max_len = max_num_chars
 
         # Loop over contained units.
-        for unit_index in \
-                context_token.get_contained_segment_indices(
-                    unit_segmentation,
-                ):
+        for unit_index in unit_indices:
 
             # Increment row_id.
             row_id += 1
@@ -1881,16 +1884,11 @@ def context(
             # Store unit position.
             new_values[(row_id, '__pos__')] = context_index + 1
 
-            # Get unit token and its string value.
-            unit_token = unit_segmentation[unit_index]
-            new_values[(row_id, '__key_segment__')] \
-                = unit_token.get_content()
+            # Get unit string value.
+            new_values[(row_id, '__key_segment__')] = unit_contents[unit_index]
             if unit_annotation_key is not None:
-                annotation_value = unit_token.annotations.get(
-                    unit_annotation_key,
-                    '__none__',
-                )
-                if units['separate_annotation']:
+                annotation_value = unit_annotations[unit_index]
+                if separate_annotation:
                     new_values[(row_id, unit_annotation_key)] \
                         = annotation_value
                 else:
@@ -1898,12 +1896,8 @@ def context(
                         = annotation_value
 
             # Left and right context...
-            unit_start = unit_token.start or 0
-            unit_end = unit_token.end or \
-                len(Segmentation.get_data(unit_token.str_index))
-            context_start = context_token.start or 0
-            context_end = context_token.end or \
-                len(Segmentation.get_data(context_token.str_index))
+            unit_start = unit_starts[unit_index]
+            unit_end = unit_ends[unit_index]
             if context_start < unit_start:
                 imm_left_start = max(
                     context_start,
@@ -1911,9 +1905,7 @@ def context(
                 )
                 if unit_start > imm_left_start:
                     new_values[(row_id, '__left__')] = \
-                        Segmentation.get_data(unit_token.str_index)[
-                            imm_left_start:unit_start
-                        ]
+                        context_string[imm_left_start:unit_start]
                     has_imm_left = True
             if context_end > unit_end:
                 imm_right_end = min(
@@ -1922,9 +1914,7 @@ def context(
                 )
                 if imm_right_end > unit_end:
                     new_values[(row_id, '__right__')] = \
-                        Segmentation.get_data(unit_token.str_index)[
-                            unit_end:imm_right_end
-                        ]
+                        context_string[unit_end:imm_right_end]
                     has_imm_right = True
 
             # Context annotation:
@@ -1942,7 +1932,7 @@ def context(
     col_ids.append('__key_segment__')
     if has_imm_right:
         col_ids.append('__right__')
-    if unit_annotation_key is not None and units['separate_annotation']:
+    if unit_annotation_key is not None and separate_annotation:
         col_ids.append(unit_annotation_key)
     if context_annotation_key is not None:
         col_ids.append(context_annotation_key)
@@ -2016,21 +2006,72 @@ def neighbors(
     # Optimization...
     unit_segmentation = units['segmentation']
     unit_annotation_key = units['annotation_key']
+    separate_annotation = units['separate_annotation']
     context_annotation_key = contexts['annotation_key']
     context_segmentation = contexts['segmentation']
     merge_strings = contexts['merge_strings']
+    num_contexts = len(context_segmentation)
 
-    # Loop over context token indices...
-    for context_index, context_segment in enumerate(context_segmentation):
+    # Get unit contents, annotations and strings once...
+    unit_contents = unit_segmentation.get_contents()
+    if unit_annotation_key is not None:
+        unit_annotations = unit_segmentation.get_annotation_values(
+            unit_annotation_key,
+        )
 
-        # Get context token and its content...
-        context_token = context_segment
+    # Get context segments in final format and their strings once...
+    if context_annotation_key is not None:
+        context_list = context_segmentation.get_annotation_values(
+            context_annotation_key,
+        )
+    else:
+        context_list = context_segmentation.get_contents()
+    context_real_str_indices = context_segmentation._get_real_str_indices()
 
-        # Loop over contained units.
-        for unit_index in \
-                context_token.get_contained_segment_indices(
-                    unit_segmentation,
+    # Build neighbor column ids once...
+    adjacent_cols = [
+        (pos, text(pos) + 'L', text(pos) + 'R') for pos in adjacent_positions
+    ]
+
+    # Get indices of units in each context token...
+    contained_indices = _get_contained_sequence_indices_by_context(
+        context_segmentation,
+        unit_segmentation,
+    )
+    if contained_indices is None:
+        contained_indices = (
+            context_token.get_contained_segment_indices(unit_segmentation)
+            for context_token in context_segmentation._iter_segments()
+        )
+
+    # Loop over context token indices...
+    for context_index, unit_indices in enumerate(contained_indices):
+
+        # Get neighboring segments once for all contained units (which
+        # refer to the same string as the context token)...
+        if unit_indices:
+            context_str_index = context_real_str_indices[context_index]
+            neighbor_values = list()
+            for pos, left_col, right_col in adjacent_cols:
+                left_index = context_index - pos
+                if left_index >= 0 and (
+                    merge_strings or
+                    context_str_index == context_real_str_indices[left_index]
+                ):
+                    neighbor_values.append(
+                        (left_col, context_list[left_index])
+                    )
+                right_index = context_index + pos
+                if right_index < num_contexts and (
+                    merge_strings or
+                    context_str_index == context_real_str_indices[right_index]
                 ):
+                    neighbor_values.append(
+                        (right_col, context_list[right_index])
+                    )
+
+        # Loop over contained units.
+        for unit_index in unit_indices:
 
             # Increment row_id.
             row_id += 1
@@ -2038,69 +2079,30 @@ def neighbors(
             # Store unit position.
             new_values[(row_id, '__pos__')] = context_index + 1
 
-            # Get unit token and its string value.
-            unit_token = unit_segmentation[unit_index]
-            new_values[(row_id, '__key_segment__')] \
-                = unit_token.get_content()
+            # Get unit string value.
+            new_values[(row_id, '__key_segment__')] = unit_contents[unit_index]
             if unit_annotation_key is not None:
-                annotation_value = unit_token.annotations.get(
-                    unit_annotation_key,
-                    '__none__',
-                )
-                if units['separate_annotation']:
+                annotation_value = unit_annotations[unit_index]
+                if separate_annotation:
                     new_values[(row_id, unit_annotation_key)] \
                         = annotation_value
                 else:
                     new_values[(row_id, '__key_segment__')] \
                         = annotation_value
 
-            # Get unit token's str_index.
-            unit_token_str_index = unit_token.get_real_str_index()
-
             # Neighboring segments...
-            for pos in adjacent_positions:
-                left_index = context_index - pos
-                if left_index >= 0:
-                    left_token = context_segmentation[left_index]
-                    if (
-                        merge_strings or
-                        unit_token_str_index == left_token.get_real_str_index()
-                    ):
-                        if context_annotation_key is not None:
-                            string_value = left_token.annotations.get(
-                                context_annotation_key,
-                                '__none__',
-                            )
-                        else:
-                            string_value = left_token.get_content()
-                        new_values[(row_id, text(pos) + 'L')] = \
-                            string_value
-                right_index = context_index + pos
-                if right_index < len(context_segmentation):
-                    right_token = context_segmentation[right_index]
-                    if (
-                        merge_strings or
-                        unit_token_str_index == right_token.get_real_str_index()
-                    ):
-                        if context_annotation_key is not None:
-                            string_value = right_token.annotations.get(
-                                context_annotation_key,
-                                '__none__',
-                            )
-                        else:
-                            string_value = right_token.get_content()
-                        new_values[(row_id, text(pos) + 'R')] = \
-                            string_value
+            for col_id, value in neighbor_values:
+                new_values[(row_id, col_id)] = value
 
         if progress_callback:
             progress_callback()
 
     # Create table...
     col_ids = ['__pos__']
-    col_ids.extend([text(p) + 'L' for p in reversed(adjacent_positions)])
+    col_ids.extend([left_col for _, left_col, _ in reversed(adjacent_cols)])
     col_ids.append('__key_segment__')
-    col_ids.extend([text(p) + 'R' for p in adjacent_positions])
-    if unit_annotation_key is not None and units['separate_annotation']:
+    col_ids.extend([right_col for _, _, right_col in adjacent_cols])
+    if unit_annotation_key is not None and separate_annotation:
         col_ids.append(unit_annotation_key)
     col_types = dict([(p, 'string') for p in col_ids])
     col_types['__pos__'] = 'continuous'
@@ -2121,6 +2123,42 @@ def neighbors(
     )
 
 
+def _get_neighbor_mask(
+    has_units,
+    real_str_indices,
+    max_distance,
+    merge_strings=False,
+):
+    """Return a boolean array telling, for each context segment, whether
+    it lies at most max_distance positions away from another context segment
+    that contains units and refers to the same string (or to any string, if
+    merge_strings is True).
+
+    Contexts are sorted by string, then position, so that the contexts
+    within max_distance of each context (on the same string) form a range;
+    the number of contexts containing units in each range is obtained by
+    cumulated sums.
+    """
+    num_contexts = len(has_units)
+    has_units = has_units.astype(np.int64)
+    max_distance = min(max(max_distance, 0), num_contexts)
+    positions = np.arange(num_contexts, dtype=np.int64)
+    if merge_strings:
+        keys = positions
+    else:
+        keys = (
+            np.array(real_str_indices, dtype=np.int64) *
+            (2 * num_contexts + 1) +
+            positions
+        )
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    num_with_units = np.concatenate(([0], np.cumsum(has_units[order])))
+    lows = np.searchsorted(sorted_keys, keys - max_distance, side='left')
+    highs = np.searchsorted(sorted_keys, keys + max_distance, side='right')
+    return num_with_units[highs] - num_with_units[lows] - has_units > 0
+
+
 def collocations(
     units=None,
     contexts=None,
@@ -2150,14 +2188,11 @@ def collocations(
         default_contexts.update(contexts)
     contexts = default_contexts
 
-    neighbor_indices = set()
-    global_freq = dict()
-    local_freq = dict()
     new_values = dict()
     if contexts['max_distance'] is not None:
-        adjacent_positions = range(1, contexts['max_distance'] + 1)
+        max_distance = contexts['max_distance']
     else:
-        adjacent_positions = range(1, len(contexts['segmentation']))
+        max_distance = len(contexts['segmentation']) - 1
 
     # Optimization...
     context_annotation_key = contexts['annotation_key']
@@ -2167,78 +2202,56 @@ def collocations(
 
     # Get the list of context segments in final formats
     if context_annotation_key is not None:
-        context_list = [
-            c.annotations.get(
-                context_annotation_key,
-                '__none__',
-            )
-            for c in context_segmentation
-        ]
+        context_list = context_segmentation.get_annotation_values(
+            context_annotation_key,
+        )
     else:
-        context_list = [c.get_content() for c in context_segmentation]
-
-    # Loop over context token indices...
-    for context_index, context_segment in enumerate(context_segmentation):
-
-        # Get context token and its content...
-        context_token = context_segment
-
-        # Increment global frequency
-        global_freq[context_list[context_index]] \
-            = global_freq.get(context_list[context_index], 0) + 1
-
-        # Loop over contained units.
-        for unit_index in context_token.get_contained_segment_indices(units):
+        context_list = context_segmentation.get_contents()
 
-            # Get unit token's str_index.
-            unit_token_str_index = units[unit_index].get_real_str_index()
+    # Count global frequency...
+    global_freq = Counter(context_list)
 
-            # Neighboring segments...
-            for pos in adjacent_positions:
-                left_index = context_index - pos
-                if left_index >= 0:
-                    if (
-                        merge_strings or
-                        unit_token_str_index ==
-                          context_segmentation[left_index].get_real_str_index()
-                    ):
-                        neighbor_indices.add(left_index)
-                right_index = context_index + pos
-                if right_index < len(context_segmentation):
-                    if (
-                        merge_strings or
-                        unit_token_str_index ==
-                          context_segmentation[right_index].get_real_str_index()
-                    ):
-                        neighbor_indices.add(right_index)
+    # Find neighbors of contexts containing units...
+    neighbor_mask = _get_neighbor_mask(
+        _get_contained_unit_counts(context_segmentation, units) > 0,
+        context_segmentation._get_real_str_indices(),
+        max_distance,
+        merge_strings,
+    )
 
-        if progress_callback:
+    if progress_callback:
+        for context_index in range(len(context_segmentation)):
             progress_callback()
 
     # Count local frequency...
-    for neighbor in [context_list[i] for i in neighbor_indices]:
-        local_freq[neighbor] = local_freq.get(neighbor, 0) + 1
+    local_freq = Counter(compress(context_list, neighbor_mask.tolist()))
 
     # Remove low frequency types if needed...
     if context_min_frequency > 1:
-        neighbor_types = [
-            i for i in sorted(local_freq.keys())
+        neighbor_types = sorted(
+            i for i in local_freq
             if global_freq[i] >= context_min_frequency
-        ]
+        )
     else:
-        neighbor_types = sorted(local_freq.keys())
+        neighbor_types = sorted(local_freq)
 
     # Total frequencies...
     local_total_count = sum([local_freq[t] for t in neighbor_types])
     global_total_count = sum(global_freq.values())
 
     # Compute mutual information and store it along with frequency...
-    for neighbor_type in neighbor_types:
-        local_prob = local_freq[neighbor_type] / local_total_count
-        global_prob = global_freq[neighbor_type] / global_total_count
-        new_values[
-            (neighbor_type, '__mutual_info__')
-        ] = math.log(local_prob / global_prob, 2)
+    local_freqs = np.array([local_freq[t] for t in neighbor_types], float)
+    global_freqs = np.array([global_freq[t] for t in neighbor_types], float)
+    local_probs = local_freqs / local_total_count
+    global_probs = global_freqs / global_total_count
+    mutual_infos = np.log2(local_probs / global_probs)
+    for neighbor_type, mutual_info, local_prob, global_prob in zip(
+        neighbor_types,
+        mutual_infos.tolist(),
+        local_probs.tolist(),
+        global_probs.tolist(),
+    ):
+        new_values[(neighbor_type, '__mutual_info__')] = mutual_info
         new_values[
             (neighbor_type, '__local_freq__')
         ] = local_freq[neighbor_type]
@@ -2273,6 +2286,63 @@ def collocations(
     )
 
 
+def _get_presence_matrix(contingency):
+    """Return a numpy array where non-zero values of a count crosstab are set
+    to 1, i.e. the same as contingency.to_normalized('presence/absence')
+    .to_numpy(), but filled from the crosstab's (sparse) values only.
+    """
+    np_table = np.zeros(
+        [len(contingency.row_ids), len(contingency.col_ids)],
+        np.int32,
+    )
+    row_index = dict((r, i) for i, r in enumerate(contingency.row_ids))
+    col_index = dict((c, i) for i, c in enumerate(contingency.col_ids))
+    cells = [
+        (row_index[row_id], col_index[col_id])
+        for (row_id, col_id), value in iteritems(contingency.values)
+        if value > 0 and row_id in row_index and col_id in col_index
+    ]
+    if cells:
+        row_indices, col_indices = zip(*cells)
+        np_table[list(row_indices), list(col_indices)] = 1
+    return np_table
+
+
+def _get_cooccurrences(np_contingency, np_contingency2=None):
+    """Return the product of the transpose of a presence/absence matrix (or
+    of a second one) with this matrix, i.e. the number of contexts where each
+    pair of units occur together.
+
+    The product is computed with floating-point BLAS routines (exact for
+    such counts), using the symmetric rank-k update when a matrix is
+    multiplied with itself, and cast back to the matrices' integer type
+    (numpy has no BLAS routines for integer matrix products). Single
+    precision is used whenever it represents all possible counts exactly,
+    i.e. when there are less than 2**24 contexts.
+    """
+    if len(np_contingency) < 2 ** 24:
+        float_type, syrk = np.float32, ssyrk
+    else:
+        float_type, syrk = np.float64, dsyrk
+    if np_contingency2 is None:
+        dtype = np_contingency.dtype
+        if np_contingency.size == 0:
+            return np.dot(np.transpose(np_contingency), np_contingency)
+        upper = syrk(
+            1.0,
+            np.asarray(np_contingency, dtype=float_type, order='F'),
+            trans=1,
+        )
+        cooc = np.triu(upper) + np.transpose(np.triu(upper, 1))
+    else:
+        dtype = np.result_type(np_contingency2, np_contingency)
+        cooc = np.dot(
+            np.transpose(np_contingency2).astype(float_type),
+            np_contingency.astype(float_type),
+        )
+    return cooc.astype(dtype)
+
+
 # TODO: docstring
 def cooc_in_window(
     units=None,
@@ -2285,12 +2355,8 @@ def cooc_in_window(
         window_size,
         progress_callback,
     )
-    normalized = contingency.to_normalized('presence/absence')
-    np_contingency = normalized.to_numpy()
-    cooc = np.dot(
-        np.transpose(np_contingency),
-        np_contingency,
-    )
+    np_contingency = _get_presence_matrix(contingency)
+    cooc = _get_cooccurrences(np_contingency)
     try:
         new_header_row_id = (
             contingency.header_row_id[:-2]
@@ -2324,24 +2390,24 @@ def cooc_in_context(
         contexts,
         progress_callback,
     )
-    normalized = contingency.to_normalized('presence/absence')
-    np_contingency = normalized.to_numpy()
+    np_contingency = _get_presence_matrix(contingency)
     if units2 is not None:
         contingency2 = count_in_context(units2, contexts, progress_callback)
-        normalized2 = contingency2.to_normalized('presence/absence')
-        np_contingency2 = normalized2.to_numpy()
+        np_contingency2 = _get_presence_matrix(contingency2)
         row_labels = contingency.row_ids
         row_labels2 = contingency2.row_ids
+        row_label_set = set(row_labels)
+        row_label_set2 = set(row_labels2)
         keep_from_contingency = [
-            i for i in xrange(len(row_labels)) if row_labels[i] in row_labels2
+            i for i, label in enumerate(row_labels) if label in row_label_set2
         ]
-        keep_from_contingency2 =[
-            i for i in xrange(len(row_labels2)) if row_labels2[i] in row_labels
+        keep_from_contingency2 = [
+            i for i, label in enumerate(row_labels2) if label in row_label_set
         ]
         try:
             np_contingency = np_contingency[keep_from_contingency].astype(int)
             np_contingency2 = np_contingency2[keep_from_contingency2].astype(int)
-            cooc = np.dot(np.transpose(np_contingency2), np_contingency)
+            cooc = _get_cooccurrences(np_contingency, np_contingency2)
             if contingency.header_row_id == contingency2.header_row_id:
                 new_header_row_id = (
                     contingency.header_row_id[:-2]
@@ -2363,7 +2429,7 @@ def cooc_in_context(
         except IndexError:
             return IntPivotCrosstab(list(), list(), dict())
     else:
-        cooc = np.dot(np.transpose(np_contingency), np_contingency)
+        cooc = _get_cooccurrences(np_contingency)
         try:
             new_header_row_id = (
                 contingency.header_row_id[:-2]
@@ -20,15 +20,9 @@ along with LTTL v2.0. If not, see <http://www.gnu.org/licenses/>.
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-from operator import itemgetter
-from itertools import groupby
-
 import numpy as np
-import operator
-
-from .Segmentation import Segmentation
 
-from builtins import range
+from .Segmentation import Segmentation, MISSING_POSITION
 
 __version__ = "1.0.4"
 
@@ -41,12 +35,15 @@ class Segment(object):
     def __init__(self, str_index, start=None, end=None, annotations=None):
         """Initialize a Segment instance"""
         if isinstance(str_index, (np.ndarray, list)):
+            # Convert a row of a segment chunk to Python ints once...
+            if isinstance(str_index, np.ndarray):
+                str_index = str_index.tolist()
             self.str_index = str_index[0]
-            if str_index[1] == np.iinfo(np.int32).max:
+            if str_index[1] == MISSING_POSITION:
                 self.start = None
             else:
                 self.start = str_index[1]
-            if str_index[2] == np.iinfo(np.int32).max:
+            if str_index[2] == MISSING_POSITION:
                 self.end = None
             else:
                 self.end = str_index[2]
@@ -74,20 +71,15 @@ class Segment(object):
         return not self.__eq__(other)
 
     def __str__(self):
-        return str(
-            [
-                getter(self)
-                for getter in [
-                    operator.attrgetter(attr) for attr in self.__slots__
-                ]
-            ]
-        )
+        return str([self.str_index, self.start, self.end, self.annotations])
 
     def get_real_str_index(self):
         """Return the index of the string which this segment refers to."""
         str_index = self.str_index
-        if isinstance(Segmentation.data[str_index], int):
-            str_index = Segmentation.data[str_index]
+        # Pointers always refer directly to a string (cf. set_data())...
+        value = Segmentation.data[str_index]
+        if isinstance(value, int):
+            return value
         return str_index
 
     def to_string(
@@ -264,6 +256,9 @@ class Segment(object):
             return False
         if (self.start or 0) > (other_segment.start or 0):
             return False
+        # Look up the string's length only if an end position is missing...
+        if self.end and other_segment.end:
+            return self.end >= other_segment.end
         string_length = len(Segmentation.get_data(self.str_index))
         if (self.end or string_length) < (other_segment.end or string_length):
             return False
@@ -278,47 +273,10 @@ class Segment(object):
 
         :return: a list of segments
         """
-        str_index = self.str_index
-        start = self.start or 0
-        string_length = len(Segmentation.get_data(str_index))
-        end = self.end or string_length
-        ret = list()
-        try:
-            # Get first and last index of segments with the same str_index...
-            start_search = segmentation.str_index_ptr[str_index]
-            end_search = min(
-                [
-                    x for x in segmentation.str_index_ptr.values()
-                    if x > start_search
-                ] + [len(segmentation)]
-            )
-
-            # Binary search for start of relevant segments...
-            while end_search - start_search > 1:
-                middle = segmentation[(end_search + start_search) // 2]
-                if (middle.start or 0) >= start:
-                    end_search = (end_search + start_search) // 2
-                else:
-                    start_search = (end_search + start_search) // 2
-
-            # In case we need the very first segment...
-            if (segmentation[start_search].start or 0) >= start:
-                start_search -= 1
-
-            # Start iterating at this point (start_search always ends up
-            # on the segment just before the one we want)...
-            for segment in segmentation[start_search + 1:]:
-                # and stop when we reach the end
-                if (
-                    str_index != segment.str_index or
-                    (segment.start or 0) > end
-                ):
-                    break
-                if end >= (segment.end or string_length):
-                    ret.append(segment)
-            return ret
-        except:
-            return list()
+        return [
+            segmentation[index]
+            for index in self.get_contained_segment_indices(segmentation)
+        ]
 
     def get_contained_segment_indices(self, segmentation):
         """Return indices of segments from another segmentation that are
@@ -331,44 +289,22 @@ class Segment(object):
         """
         str_index = self.str_index
         start = self.start or 0
-        string_length = len(Segmentation.get_data(str_index))
-        end = self.end or string_length
-        ret = list()
-        try:
-            # Get first and last index of segments with the same str_index
-            start_search = segmentation.str_index_ptr[str_index]
-            end_search = min(
-                [
-                    x for x in segmentation.str_index_ptr.values()
-                    if x > start_search
-                ] + [len(segmentation)]
-            )
-
-            # Binary search for start of relevant segments...
-            while end_search - start_search > 1:
-                middle = segmentation[(end_search + start_search) // 2]
-                if (middle.start or 0) >= start:
-                    end_search = (end_search + start_search) // 2
-                else:
-                    start_search = (end_search + start_search) // 2
-
-            # In case we need the very first segment...
-            if (segmentation[start_search].start or 0) >= start:
-                start_search -= 1
-
-            # start iterating at this point...
-            for i, segment in enumerate(segmentation[start_search + 1:]):
-                # and stop when we reach the end
-                if (
-                    str_index != segment.str_index or
-                    (segment.start or 0) > end
-                ):
-                    break
-                if end >= (segment.end or string_length):
-                    ret.append(i + (start_search + 1))
-            return ret
-        except:
+        end = self.end or len(Segmentation.get_data(str_index))
+        # Get first and last index of segments with the same str_index
+        str_index_ranges = segmentation._get_str_index_ranges()
+        if str_index not in str_index_ranges:
             return list()
+        start_search, end_search = str_index_ranges[str_index]
+
+        # Binary search for the range of segments starting within this one
+        # (these segments are sorted by start position)...
+        _, starts, ends = segmentation._get_addresses()
+        starts = starts[start_search:end_search]
+        first = start_search + np.searchsorted(starts, start, side='left')
+        last = start_search + np.searchsorted(starts, end, side='right')
+
+        # Keep those that also end within this one...
+        return (np.flatnonzero(ends[first:last] <= end) + first).tolist()
 
     def get_contained_sequence_indices(self, segmentation, length):
         """Return indices of first position of sequences of segments from
@@ -382,24 +318,16 @@ class Segment(object):
         :return: a list of segment indices
         """
         contained_indices = self.get_contained_segment_indices(segmentation)
-        # Find runs of consecutive contained indices
-        # (cf. https://docs.python.org/2.6/library/itertools.html#examples)
-        contained_idx_sequences = [
-            list(map(itemgetter(1), g)) for _, g in groupby(
-                enumerate(contained_indices),
-                lambda args: args[0] - args[1]
+        # Contained indices are increasing, so a sequence of the given length
+        # starts at an index if the index length-1 positions further is
+        # exactly length-1 larger...
+        return [
+            first_index for first_index, last_index in zip(
+                contained_indices,
+                contained_indices[length - 1:],
             )
+            if last_index - first_index == length - 1
         ]
-        fixed_length_idx_sequences = list()
-        for contained_idx_sequence in contained_idx_sequences:
-            fixed_length_idx_sequences.extend(
-                [
-                    contained_idx_sequence[idx] for idx in range(
-                        len(contained_idx_sequence) - length + 1
-                    )
-                ]
-            )
-        return fixed_length_idx_sequences
 
 # Not currently used in LTTL, nor tested.
 #    def contains_sequence(self, sequence):
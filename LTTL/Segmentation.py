@@ -28,7 +28,7 @@ import re
 import os
 
 from tempfile import NamedTemporaryFile
-from collections import deque
+from collections import OrderedDict
 
 __version__ = "1.0.5"
 
@@ -45,11 +45,18 @@ CHUNK_SIZE = 1000000
 # maximum number of chunks that are kept in RAM
 CACHE_SIZE = 200
 
+# value standing for a missing start or end position in chunks
+MISSING_POSITION = np.iinfo(np.int32).max
+
+# key of each interpolated variable in a formatting string, e.g. %(key)s
+FORMATTING_KEY_PATTERN = re.compile(r'%\((.+?)\)')
+
 # contains the chunk or a reference to the file on disk
 segments_cache = dict()
 
-# list of chunk ids ordered by Least Recently Used
-segments_access_time = deque()
+# chunk ids of chunks kept in RAM, ordered from least to most recently used
+# (keys only; an OrderedDict moves and evicts ids in constant time)
+segments_access_time = OrderedDict()
 
 
 def load_chunk(segmentation, id):
@@ -76,13 +83,13 @@ def get_chunk(segmentation, id):
     if not (segmentation, id) in segments_cache:
         return None
     if isinstance(segments_cache[(segmentation, id)], np.ndarray):
-        segments_access_time.remove((segmentation, id))
-        segments_access_time.appendleft((segmentation, id))
+        del segments_access_time[(segmentation, id)]
+        segments_access_time[(segmentation, id)] = None
     else:
         while len(segments_access_time) >= CACHE_SIZE:
-            k = segments_access_time.pop()
+            k, _ = segments_access_time.popitem(last=False)
             unload_chunk(k[0], k[1])
-        segments_access_time.appendleft((segmentation, id))
+        segments_access_time[(segmentation, id)] = None
         load_chunk(segmentation, id)
     return segments_cache[(segmentation, id)]
 
@@ -91,8 +98,8 @@ def set_chunk(segmentation, id, array):
     """Replace a chunks' content"""
     get_chunk(segmentation, id)
     segments_cache[(segmentation, id)] = array
-    segments_access_time.remove((segmentation, id))
-    segments_access_time.appendleft((segmentation, id))
+    del segments_access_time[(segmentation, id)]
+    segments_access_time[(segmentation, id)] = None
 
 
 def add_chunk(segmentation, id, array):
@@ -101,9 +108,9 @@ def add_chunk(segmentation, id, array):
         set_chunk(segmentation, id, array)
         return True
     while len(segments_access_time) >= CACHE_SIZE:
-        k = segments_access_time.pop()
+        k, _ = segments_access_time.popitem(last=False)
         unload_chunk(k[0], k[1])
-    segments_access_time.appendleft((segmentation, id))
+    segments_access_time[(segmentation, id)] = None
     segments_cache[(segmentation, id)] = array
     return False
 
@@ -114,7 +121,7 @@ def remove_chunk(segmentation, id):
         return
     if isinstance(segments_cache[(segmentation, id)], np.ndarray):
         del segments_cache[(segmentation, id)]
-        segments_access_time.remove((segmentation, id))
+        del segments_access_time[(segmentation, id)]
     else:
         my_file = segments_cache[(segmentation, id)]
         os.remove(my_file.name)
@@ -143,6 +150,10 @@ class Segmentation(object):
     # there should be no pointer to pointer !
     data = list()
 
+    # incremented whenever a string in data is replaced, so that cached
+    # segment contents can be recognized as stale
+    _data_version = 0
+
     @staticmethod
     def get_data(index):
         """
@@ -191,6 +202,7 @@ class Segmentation(object):
             ):
                 raise IndexError("Pointers can only replace pointers")
             Segmentation.data[index] = value_or_ref
+            Segmentation._data_version += 1
         else:
             Segmentation.data.append(value_or_ref)
 
@@ -227,6 +239,11 @@ class Segmentation(object):
                 self.label = segmentation.label
             else:
                 self.label = label
+        # lazily computed columns (contents, annotation values, addresses),
+        # cleared whenever the segmentation is modified through its own
+        # methods; they stay in RAM for the lifetime of the segmentation,
+        # even when its segments are offloaded to disk in chunks
+        self._columns = dict()
 
     def __del__(self):
         try:
@@ -258,6 +275,7 @@ class Segmentation(object):
         """Set the value of a given segment"""
         if index < 0:
             index = self.segments_nbr + index
+        self._columns.clear()
         if index >= self.segments_nbr_in_chunk:
             self.buffer[index - self.segments_nbr_in_chunk] = segment
         else:
@@ -269,7 +287,7 @@ class Segmentation(object):
             set_chunk(self, index // CHUNK_SIZE+1, a)
             if (
                 segment.annotations is not None or
-                len(segment.annotations) is not 0
+                len(segment.annotations) != 0
             ):
                 self.create_anotation()
                 b = get_chunk(self, -(index // CHUNK_SIZE+1))
@@ -285,24 +303,36 @@ class Segmentation(object):
 
     def __iter__(self):
         """Return an iterator on segments"""
+        return self._iter_segments(copy=True)
+
+    def _iter_segments(self, copy=False):
+        """Return an iterator on segments; segments kept in the buffer are
+        yielded as is (not copied) unless copy is True, so that read-only
+        callers don't pay for a deepcopy of each segment"""
         from .Segment import Segment
         if self.segments_nbr_in_chunk > 0:
             for i in range(1, self.segments_nbr_in_chunk // CHUNK_SIZE+1):
                 a = get_chunk(self, i)
                 b = get_chunk(self, -i)
                 if a is not None:
-                    for index in range(len(a)):
-                        annotation = None
-                        if b is not None:
-                            annotation = dict(
-                                [
-                                    self.id_to_key[x]
-                                    for x in b[index % CHUNK_SIZE]
-                                ]
+                    # Convert the chunks to Python objects once...
+                    rows = a.tolist()
+                    if b is not None:
+                        id_to_key = self.id_to_key
+                        for row, annotation_ids in zip(rows, b.tolist()):
+                            yield Segment(
+                                row,
+                                dict([id_to_key[x] for x in annotation_ids]),
                             )
-                        yield Segment(a[index % CHUNK_SIZE], annotation)
-        for segment in self.buffer:
-            yield segment.deepcopy()
+                    else:
+                        for row in rows:
+                            yield Segment(row, None)
+        if copy:
+            for segment in self.buffer:
+                yield segment.deepcopy()
+        else:
+            for segment in self.buffer:
+                yield segment
 
     def _get_str_index_ptr(self, segments, before_first_segment=None, offset=0):
         """Finds at which index segments start referring to new str_index"""
@@ -319,43 +349,41 @@ class Segmentation(object):
 
     def create_anotation(self):
         if not self.has_annotation():
+            # Chunks of annotation ids are object arrays, where segments
+            # without annotations share the same (never modified) empty
+            # array of ids...
+            no_annotation_ids = np.empty(0, dtype=np.int16)
+
+            def get_empty_chunk(size):
+                chunk = np.empty(size, dtype=object)
+                chunk.fill(no_annotation_ids)
+                return chunk
+
             nb_segment = self.segments_nbr_in_chunk
             id = -1
             while nb_segment > CHUNK_SIZE:
-                add_chunk(
-                    self, id, np.array(
-                        [np.empty(0, dtype=np.int16) for _ in range(CHUNK_SIZE)]
-                    )
-                )
+                add_chunk(self, id, get_empty_chunk(CHUNK_SIZE))
                 nb_segment -= CHUNK_SIZE
                 id -= 1
-            add_chunk(
-                self, id, np.array(
-                    [np.empty(0, dtype=np.int16) for _ in range(nb_segment)]
-                )
-            )
+            add_chunk(self, id, get_empty_chunk(nb_segment))
             self.id_to_key = list()
             self.key_to_id = dict()
 
     def get_annotation_tab(self, segment):
         annotations_id = list()
         for key, value in iteritems(segment.annotations):
-            self.add_annotation_tuple((key, value))
-            annotations_id.append(
-                [
-                    id for id in self.key_to_id[hash((key, value))]
-                    if self.id_to_key[id] == (key, value)
-                ][0]
-            )
+            annotations_id.append(self.add_annotation_tuple((key, value)))
         return annotations_id
 
     def add_annotation_tuple(self, my_tuple):
-        id_list = self.key_to_id.get(hash(my_tuple), list())
-        if my_tuple not in [self.id_to_key[x] for x in id_list]:
+        """Return the id of an annotation (key, value) pair, assigning it a
+        new id if needed"""
+        try:
+            return self.key_to_id[my_tuple]
+        except KeyError:
             self.id_to_key.append(my_tuple)
-            self.key_to_id[hash(my_tuple)] = self.key_to_id.get(
-                hash(my_tuple), list()
-            ) + [len(self.id_to_key) - 1]
+            self.key_to_id[my_tuple] = len(self.id_to_key) - 1
+            return len(self.id_to_key) - 1
 
     def get_annotation(self, index):
         if index >= self.segments_nbr_in_chunk:
@@ -366,6 +394,195 @@ class Segmentation(object):
                 return None
             return dict([self.id_to_key[x] for x in a[index % CHUNK_SIZE]])
 
+    def get_contents(self):
+        """Return the tuple of segment contents, in segmentation order
+
+        The result is cached until the segmentation (or one of the strings
+        it refers to) is modified. Segments passed to append(), extend() or
+        __setitem__() are kept by reference: modifying such a segment in
+        place afterwards is not detected and leaves the cache stale. The
+        cached tuple is kept in RAM as long as the segmentation exists.
+        """
+        return self._get_column(
+            '__content__',
+            lambda: tuple(s.get_content() for s in self._iter_segments()),
+        )
+
+    def get_annotation_values(self, annotation_key, default='__none__'):
+        """Return the tuple of values of a given annotation key, in
+        segmentation order (default for segments lacking this key)
+
+        The result is cached until the segmentation is modified (cf.
+        get_contents() about segments modified in place).
+        """
+        return self._get_column(
+            (annotation_key, default),
+            lambda: tuple(
+                (s.annotations or {}).get(annotation_key, default)
+                for s in self._iter_segments()
+            ),
+        )
+
+    def _intern(self, annotation_key=None):
+        """Return the dictionary encoding of segment contents (or of the
+        values of a given annotation key, if not None)
+
+        :return: a tuple whose first element is a read-only int32 array with
+        the code of each segment's value, and whose second element is the
+        tuple of distinct values (in order of first occurrence) indexed by
+        these codes.
+
+        The result is cached until the segmentation is modified.
+        """
+        def build_encoding():
+            if annotation_key is None:
+                values = self.get_contents()
+            else:
+                values = self.get_annotation_values(annotation_key)
+            # Distinct values are listed explicitly in code order, since
+            # dict order is arbitrary in Python 2...
+            value_codes = dict()
+            distinct_values = list()
+
+            def get_code(value):
+                try:
+                    return value_codes[value]
+                except KeyError:
+                    code = value_codes[value] = len(distinct_values)
+                    distinct_values.append(value)
+                    return code
+
+            codes = np.fromiter(
+                (get_code(value) for value in values),
+                dtype=np.int32,
+                count=len(values),
+            )
+            codes.flags.writeable = False
+            return codes, tuple(distinct_values)
+        return self._get_column(('__intern__', annotation_key), build_encoding)
+
+    def _get_addresses(self):
+        """Return segment addresses as three read-only int64 arrays
+        (str_index, start, end), where a missing start position is replaced
+        with 0 and a missing end position with the string length
+
+        The result is cached until the segmentation (or one of the strings
+        it refers to) is modified.
+        """
+        def build_addresses():
+            string_lengths = dict()
+
+            def get_string_length(str_index):
+                try:
+                    return string_lengths[str_index]
+                except KeyError:
+                    string_length = len(Segmentation.get_data(str_index))
+                    string_lengths[str_index] = string_length
+                    return string_length
+
+            # Read stored chunks as whole arrays...
+            columns = list()
+            num_chunks = self.segments_nbr_in_chunk // CHUNK_SIZE
+            for i in range(1, num_chunks + 1):
+                chunk = get_chunk(self, i)
+                if chunk is None:
+                    continue
+                str_indices, starts, ends = chunk.astype(np.int64).T.copy()
+                starts[starts == MISSING_POSITION] = 0
+                missing_ends = (ends == MISSING_POSITION) | (ends == 0)
+                missing_str_indices, inverse = np.unique(
+                    str_indices[missing_ends],
+                    return_inverse=True,
+                )
+                ends[missing_ends] = np.array(
+                    [
+                        get_string_length(str_index)
+                        for str_index in missing_str_indices.tolist()
+                    ],
+                    dtype=np.int64,
+                )[inverse]
+                columns.append((str_indices, starts, ends))
+
+            # ...and buffered segments one by one.
+            str_indices = list()
+            starts = list()
+            ends = list()
+            for segment in self.buffer:
+                str_index = segment.str_index
+                str_indices.append(str_index)
+                starts.append(segment.start or 0)
+                ends.append(segment.end or get_string_length(str_index))
+            columns.append(
+                tuple(
+                    np.array(column, dtype=np.int64)
+                    for column in (str_indices, starts, ends)
+                )
+            )
+
+            addresses = tuple(
+                np.concatenate(column) for column in zip(*columns)
+            )
+            for column in addresses:
+                column.flags.writeable = False
+            return addresses
+        return self._get_column('__addresses__', build_addresses)
+
+    def _get_real_str_indices(self):
+        """Return the list of indices of the strings which segments refer to
+        (cf. Segment.get_real_str_index()), looking up each string only once
+
+        The result is cached until the segmentation (or one of the strings
+        it refers to) is modified.
+        """
+        def build_real_str_indices():
+            real_str_indices = dict()
+            for str_index in set(self._get_addresses()[0].tolist()):
+                value = Segmentation.data[str_index]
+                if isinstance(value, int):
+                    real_str_indices[str_index] = value
+                else:
+                    real_str_indices[str_index] = str_index
+            return [
+                real_str_indices[str_index]
+                for str_index in self._get_addresses()[0].tolist()
+            ]
+        return self._get_column(
+            '__real_str_indices__',
+            build_real_str_indices,
+        )
+
+    def _get_str_index_ranges(self):
+        """Return a dict mapping each str_index in str_index_ptr to the range
+        (first index, index after last) of the segments that refer to it,
+        i.e. up to the next pointer or the end of the segmentation
+
+        The result is cached until the segmentation is modified.
+        """
+        def build_str_index_ranges():
+            ptrs = sorted(set(self.str_index_ptr.values()))
+            ends = dict(zip(ptrs, ptrs[1:] + [len(self)]))
+            return dict(
+                (str_index, (ptr, ends[ptr]))
+                for str_index, ptr in iteritems(self.str_index_ptr)
+            )
+        return self._get_column(
+            '__str_index_ranges__',
+            build_str_index_ranges,
+        )
+
+    def _get_column(self, column_key, build_column):
+        """Return a cached column, (re)building it if needed
+
+        Columns are only invalidated by the segmentation's own modifying
+        methods and by changes to Segmentation.data, not by in-place
+        modifications of segments kept in the buffer (cf. get_contents()).
+        """
+        data_version, column = self._columns.get(column_key, (None, None))
+        if data_version != Segmentation._data_version:
+            column = build_column()
+            self._columns[column_key] = (Segmentation._data_version, column)
+        return column
+
     def extend(self, segments):
         if self.segments_nbr > 0:
             new_ptrs = self._get_str_index_ptr(
@@ -377,6 +594,7 @@ class Segmentation(object):
         else:
             new_ptrs = self._get_str_index_ptr(segments)
         self.str_index_ptr = new_ptrs
+        self._columns.clear()
         self.buffer += segments
         self.segments_nbr += len(segments)
         while len(self.buffer) >= CHUNK_SIZE:
@@ -385,6 +603,7 @@ class Segmentation(object):
     def append(self, segment):
         if self.segments_nbr == 0 or self[-1].str_index != segment.str_index:
             self.str_index_ptr[segment.str_index] = self.segments_nbr
+        self._columns.clear()
         self.buffer.append(segment)
         self.segments_nbr += 1
         if len(self.buffer) >= CHUNK_SIZE:
@@ -407,21 +626,22 @@ class Segmentation(object):
             self.buffer = segments + self.buffer
             self.segments_nbr_in_chunk -= len(segments)
         nbelement_to_store = min(len(self.buffer), CHUNK_SIZE)
+        segments_to_store = self.buffer[:nbelement_to_store]
         ex_mat = np.empty([nbelement_to_store, 3], dtype=np.int32)
+        ex_mat[:, 0] = [segment.str_index for segment in segments_to_store]
+        ex_mat[:, 1] = [
+            MISSING_POSITION if segment.start is None else segment.start
+            for segment in segments_to_store
+        ]
+        ex_mat[:, 2] = [
+            MISSING_POSITION if segment.end is None else segment.end
+            for segment in segments_to_store
+        ]
         ex_annotation = np.empty([nbelement_to_store], dtype=np.object)
         for index in range(nbelement_to_store):
-            ex_mat[index][0] = self.buffer[index].str_index
-            if self.buffer[index].start is None:
-                ex_mat[index][1] = np.iinfo(np.int32).max
-            else:
-                ex_mat[index][1] = self.buffer[index].start
-            if self.buffer[index].end is None:
-                ex_mat[index][2] = np.iinfo(np.int32).max
-            else:
-                ex_mat[index][2] = self.buffer[index].end
             if (
                 self.buffer[index].annotations is not None or
-                len(self.buffer[index].annotations) is not 0
+                len(self.buffer[index].annotations) != 0
             ):
                 self.create_anotation()
                 ex_annotation[index] =  \
@@ -524,8 +744,8 @@ class Segmentation(object):
                 default_dict = dict(
                     (k, '__none__') for k in self.get_annotation_keys()
                 )
-                for match in re.finditer(r'(?<=%\()(.+?)(?=\))', formatting):
-                    default_dict[match.group(0)] = '__none__'
+                for match in FORMATTING_KEY_PATTERN.finditer(formatting):
+                    default_dict[match.group(1)] = '__none__'
 
             string += segment_delimiter.join(
                 [
@@ -536,7 +756,7 @@ class Segmentation(object):
                         default_dict,
                         progress_callback
                     )
-                    for index, segment in enumerate(self)
+                    for index, segment in enumerate(self._iter_segments())
                 ]
             )
 
@@ -551,8 +771,8 @@ class Segmentation(object):
                 default_dict = dict(
                     (k, '__none__') for k in self.get_annotation_keys()
                 )
-                for match in re.finditer(r'(?<=%\()(.+?)(?=\))', formatting):
-                    default_dict[match.group(0)] = '__none__'
+                for match in FORMATTING_KEY_PATTERN.finditer(formatting):
+                    default_dict[match.group(1)] = '__none__'
 
             string += segment_delimiter.join(
                 [
@@ -667,7 +887,7 @@ class Segmentation(object):
                         index+1,
                         progress_callback
                     )
-                    for index, segment in enumerate(self)
+                    for index, segment in enumerate(self._iter_segments())
                 ]
             )
             string += "</body></html>"
@@ -717,36 +937,32 @@ class Segmentation(object):
         annotation_keys = set()
 
         # Take the union of each segment's annotation keys...
-        for segment in self:
-            annotation_keys = annotation_keys.union(
-                list(segment.annotations)
-            )
+        for segment in self._iter_segments():
+            annotation_keys.update(segment.annotations)
 
         return sorted(list(annotation_keys))
 
     def is_non_overlapping(self):
         """Determine if there is no segment overlap"""
 
-        # Get list of segments sorted by address...
-        segmentation_sorted = self._sort()
-
-        # For each segment (but the last)...
-        for first_index in range(len(segmentation_sorted) - 1):
-
-            # Get the segment's address...
-            first_segment = segmentation_sorted[first_index]
-            first_str_index = first_segment.str_index
-            first_string_length = len(Segmentation.get_data(first_str_index))
-            first_end = first_segment.end or first_string_length
-
-            # For each segment after this one...
-            for second_index in range(
-                first_index + 1, len(segmentation_sorted)
-            ):
-                second_segment = segmentation_sorted[second_index]
-                if second_segment.str_index != first_str_index:
-                    continue
-                if (second_segment.start or 0) < first_end:
-                    return False
-
-        return True
+        # Get addresses of segments sorted by address...
+        str_indices, starts, ends = self._sort()._get_addresses()
+        if len(str_indices) < 2:
+            return True
+
+        # Group segments by string (keeping their order within a string)...
+        order = np.argsort(str_indices, kind='mergesort')
+        str_indices = str_indices[order]
+        starts = starts[order]
+        ends = ends[order]
+
+        # A segment overlaps with a previous one (referring to the same
+        # string) if it starts before the largest end position so far. To
+        # restart the running maximum at each string, positions are shifted
+        # by a string-specific offset that exceeds all positions of previous
+        # strings...
+        is_new_string = str_indices[1:] != str_indices[:-1]
+        offsets = np.concatenate(([0], np.cumsum(is_new_string)))
+        offsets *= max(starts.max(), ends.max()) + 1
+        previous_max_ends = np.maximum.accumulate(ends + offsets)[:-1]
+        return not np.any(starts[1:] + offsets[1:] < previous_max_ends)
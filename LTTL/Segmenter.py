@@ -92,11 +92,15 @@ def concatenate(
     new_segments.label = label
 
     # ordered list of all unique str_index involved
+    # (along with the input segmentations using each of them)
     str_indices = list()
+    segmentations_by_str_index = dict()
     for segmentation in segmentations:
         for k in segmentation.str_index_ptr.keys():
-            if k not in str_indices:
+            if k not in segmentations_by_str_index:
                 str_indices.append(k)
+                segmentations_by_str_index[k] = list()
+            segmentations_by_str_index[k].append(segmentation)
 
     # Sort output segment list if needed...
     if sort:
@@ -108,13 +112,12 @@ def concatenate(
         merge_ptr = list()
 
         # Get all input segmentations using this str_index...
-        for segmentation in segmentations:
-            if index in segmentation.str_index_ptr:
-                merge_ptr.append((
-                    segmentation,
-                    segmentation.str_index_ptr[index],
-                    segmentation[segmentation.str_index_ptr[index]]
-                ))
+        for segmentation in segmentations_by_str_index[index]:
+            merge_ptr.append((
+                segmentation,
+                segmentation.str_index_ptr[index],
+                segmentation[segmentation.str_index_ptr[index]]
+            ))
 
         # Used to remove duplicates if necessary
         last_seen = None
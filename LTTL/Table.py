@@ -38,6 +38,8 @@ import os
 import math
 import sys
 
+from collections import Counter
+
 from builtins import str as text
 from future.utils import iteritems
 from past.builtins import xrange
@@ -1137,13 +1139,15 @@ class FlatCrosstab(Crosstab):
                     ]
                 )
             )
-            for row_id in self.row_ids:
-                pair = (
+            new_values.update(Counter(
+                (
                     self.values[row_id, new_header_col_id],
                     self.values[row_id, new_header_row_id],
                 )
-                new_values[pair] = new_values.get(pair, 0) + 1
-                if progress_callback:
+                for row_id in self.row_ids
+            ))
+            if progress_callback:
+                for row_id in self.row_ids:
                     progress_callback()
         else:
             if self._cached_row_id is not None:
@@ -1151,13 +1155,12 @@ class FlatCrosstab(Crosstab):
             else:
                 cached_row_id = '__data__'
             new_row_ids.append(cached_row_id)
-            for row_id in self.row_ids:
-                pair = (
-                    cached_row_id,
-                    self.values[row_id, new_header_row_id],
-                )
-                new_values[pair] = new_values.get(pair, 0) + 1
-                if progress_callback:
+            new_values.update(Counter(
+                (cached_row_id, self.values[row_id, new_header_row_id])
+                for row_id in self.row_ids
+            ))
+            if progress_callback:
+                for row_id in self.row_ids:
                     progress_callback()
         return (
             IntPivotCrosstab(
@@ -24,6 +24,7 @@ Provides public functions:
 - get_average()
 - get_perplexity()
 - tuple_to_simple_dict()
+- tuple_to_simple_dicts()
 - tuple_to_simple_dict_transpose()
 - get_unused_char_in_segmentation()
 - generate_random_annotation_key()
@@ -39,15 +40,9 @@ from builtins import range, chr
 
 import random, math
 
-try:
-    from functools import lru_cache
-except ImportError:
-    from backports.functools_lru_cache import lru_cache
+import numpy as np
 
-try:
-    from scipy.special import comb as binom
-except ImportError:
-    from scipy.misc import comb as binom
+from scipy.special import gammaln
    
 
 from .Segmentation import Segmentation
@@ -55,6 +50,10 @@ from .Segment import Segment
 
 __version__ = "1.0.5"
 
+# numpy generator used for sampling, reseeded from the random module at
+# each use (so that random.seed() still makes sampling reproducible)
+_random_state = np.random.RandomState()
+
 
 def iround(x):
     """Round a number to the nearest integer
@@ -67,23 +66,152 @@ def iround(x):
 
 def sample_dict(dictionary, sample_size):
     """Return a randomly sampled frequency dict"""
-    new_dict = dict()
-    num_to_sample = sample_size
-    num_to_process = sum(itervalues(dictionary))
-    for (k, v) in iteritems(dictionary):
-        for i in range(v):
-            if random.random() < num_to_sample / num_to_process:
-                new_dict[k] = new_dict.get(k, 0) + 1
-                num_to_sample -= 1
-            num_to_process -= 1
-            if num_to_sample == 0:
+    keys, cumulated_counts, num_to_process = _get_cumulated_counts(dictionary)
+    if sample_size > num_to_process:
+        raise ValueError(u'Not enough elements in dictionary')
+    counts = _draw_counts(cumulated_counts, num_to_process, sample_size)
+    return dict(
+        (keys[index], count)
+        for index, count in enumerate(counts.tolist())
+        if count
+    )
+
+
+def _get_cumulated_counts(dictionary):
+    """Return the keys of a frequency dict, the array of their cumulated
+    counts and the total count (cf. _draw_counts())
+    """
+    keys = list(dictionary)
+    cumulated_counts = np.cumsum([dictionary[k] for k in keys], dtype=np.int64)
+    num_to_process = int(cumulated_counts[-1]) if keys else 0
+    return keys, cumulated_counts, num_to_process
+
+
+def _draw_counts(cumulated_counts, num_to_process, sample_size):
+    """Sample token positions without replacement and return the array of
+    the number of positions falling in each key (cf. _get_cumulated_counts())
+    """
+    _random_state.seed(random.getrandbits(32))
+    positions = _random_state.permutation(num_to_process)[:sample_size]
+    return np.bincount(
+        np.searchsorted(cumulated_counts, positions, side='right'),
+        minlength=len(cumulated_counts),
+    )
+
+
+def _get_subsample_varieties(
+        dictionary,
+        subsample_size,
+        num_subsamples,
+        unit_weighting=False,
+        category_weighting=False,
+        category_delimiter=None,
+):
+    """Return the varieties of a number of random subsamples of a frequency
+    dict, i.e. the same as calling get_variety() on the result of
+    sample_dict() repeatedly, but with keys split into categories once and
+    subsamples handled as arrays of counts (empty list if the dict has not
+    enough elements).
+    """
+    keys, cumulated_counts, num_to_process = _get_cumulated_counts(dictionary)
+    if subsample_size > num_to_process:
+        return list()
+
+    # Empty subsamples have no (or an undefined) variety, defer to
+    # get_variety() for them...
+    if subsample_size < 1:
+        varieties = list()
+        for i in range(num_subsamples):
+            try:
+                varieties.append(
+                    get_variety(
+                        sample_dict(dictionary, subsample_size),
+                        unit_weighting,
+                        category_weighting,
+                        category_delimiter,
+                    )
+                )
+            except ValueError:
                 break
-        else:
+        return varieties
+
+    # Sort keys by category (once for all subsamples)...
+    if category_delimiter is not None:
+        category_indices = dict()
+        key_categories = np.array(
+            [
+                category_indices.setdefault(
+                    k.split(category_delimiter, 1)[0],
+                    len(category_indices),
+                )
+                for k in keys
+            ],
+            dtype=np.int64,
+        )
+        category_order = np.argsort(key_categories, kind='stable')
+        category_starts = np.searchsorted(
+            key_categories[category_order],
+            np.arange(len(category_indices)),
+        )
+
+    varieties = list()
+    for i in range(num_subsamples):
+
+        # Draw a subsample (cf. sample_dict())...
+        counts = _draw_counts(cumulated_counts, num_to_process, subsample_size)
+
+        # Compute variety (cf. get_variety())...
+        if category_delimiter is None:
+            if unit_weighting:
+                varieties.append(_get_array_perplexity(counts))
+            else:
+                varieties.append(int(np.count_nonzero(counts)))
             continue
-        break
-    if num_to_sample > 0:
-        raise ValueError(u'Not enough elements in dictionary')
-    return new_dict
+        counts = counts[category_order]
+        category_counts = np.add.reduceat(counts, category_starts)
+        is_present = category_counts > 0
+        if not unit_weighting and not category_weighting:
+            varieties.append(
+                int(np.count_nonzero(counts)) /
+                int(np.count_nonzero(is_present))
+            )
+            continue
+        category_counts = category_counts[is_present]
+        if unit_weighting:
+            category_sums_of_logs = np.add.reduceat(
+                counts * np.log(np.maximum(counts, 1)),
+                category_starts,
+            )[is_present]
+            category_varieties = np.exp(
+                np.log(category_counts) -
+                category_sums_of_logs / category_counts
+            )
+        else:
+            category_varieties = np.add.reduceat(
+                (counts > 0).astype(np.int64),
+                category_starts,
+            )[is_present]
+        if len(category_varieties) == 1:
+            varieties.append(category_varieties.tolist()[0])
+        elif category_weighting:
+            varieties.append(
+                float(np.dot(category_varieties, category_counts)) /
+                int(category_counts.sum())
+            )
+        else:
+            varieties.append(
+                float(category_varieties.sum()) / len(category_varieties)
+            )
+    return varieties
+
+
+def _get_array_perplexity(counts):
+    """Compute the perplexity (=exp entropy) of an array of counts"""
+    counts = counts[counts > 0]
+    total = counts.sum()
+    return math.exp(
+        math.log(total) - float(np.dot(counts, np.log(counts))) / total
+    )
 
 
 def get_variety(
@@ -118,13 +246,11 @@ def get_variety(
                     unit_dict[k] = unit_dict.get(k, 0) + 1
             varieties = list()
             weights = list()
+            local_unit_dicts = tuple_to_simple_dicts(units_in_category_dict)
             for category in category_dict:
                 if category_weighting:
                     weights.append(category_dict[category])
-                local_unit_dict = tuple_to_simple_dict(
-                    units_in_category_dict,
-                    category,
-                )
+                local_unit_dict = local_unit_dicts.get(category, dict())
                 if unit_weighting:
                     varieties.append(get_perplexity(local_unit_dict))
                 else:
@@ -139,36 +265,44 @@ def get_expected_subsample_variety(dictionary, subsample_size):
     """Compute the expected variety of a subsample of given size drawn from a
     given frequency dictionary.
     """
-    sample_size = sum(dictionary.values())
-    if subsample_size > sample_size:
-        raise ValueError(u'Not enough elements in dictionary')
-    num_subsamples = binom(sample_size, subsample_size, exact=True)
-    expected_variety = len(dictionary)
-    for freq in dictionary.values():
-        expected_variety -= _prob_no_occurrence(
-            sample_size, subsample_size, freq, num_subsamples
-        )
-    return expected_variety
+    return _get_expected_subsample_variety(
+        _get_frequency_array(dictionary),
+        subsample_size,
+    )
 
 
-@lru_cache(maxsize=None)
-def _prob_no_occurrence(
-        sample_size,
-        subsample_size,
-        sample_freq,
-        num_subsamples
-    ):
-    """Compute the probability that an type with a given probability does not
-    occur in a subsample of given size drawn from a population of a given size.
+def _get_frequency_array(dictionary):
+    """Return the values of a frequency dictionary as a float array"""
+    return np.fromiter(
+        itervalues(dictionary),
+        dtype=np.float64,
+        count=len(dictionary),
+    )
+
+
+def _get_expected_subsample_variety(freqs, subsample_size):
+    """Compute the expected variety of a subsample of given size drawn from a
+    given array of frequencies (cf. get_expected_subsample_variety()).
     """
-    if sample_freq > sample_size - subsample_size:
-        return 0
-    else:
-        return binom(
-            sample_size-sample_freq,
-            subsample_size,
-            exact=True
-        ) / num_subsamples
+    sample_size = freqs.sum()
+    if subsample_size > sample_size:
+        raise ValueError(u'Not enough elements in dictionary')
+
+    # Subtract the probability that each type does not occur in the
+    # subsample, i.e. C(sample_size-freq, subsample_size) divided by
+    # C(sample_size, subsample_size), computed with log-gamma (types with
+    # freq > sample_size-subsample_size always occur, and if all types do,
+    # the expected variety is exactly the number of types)...
+    rare_freqs = freqs[freqs <= sample_size - subsample_size]
+    if not rare_freqs.size:
+        return len(freqs)
+    log_probs_no_occurrence = (
+        gammaln(sample_size - rare_freqs + 1) -
+        gammaln(sample_size - rare_freqs - subsample_size + 1) +
+        gammaln(sample_size - subsample_size + 1) -
+        gammaln(sample_size + 1)
+    )
+    return len(freqs) - float(np.exp(log_probs_no_occurrence).sum())
 
 
 def tuple_to_simple_dict(dictionary, key):
@@ -184,6 +318,23 @@ def tuple_to_simple_dict(dictionary, key):
     )
 
 
+def tuple_to_simple_dicts(dictionary):
+    """Take a dict with size-2 tuple key and return a dict mapping each 1st
+    key element to a dict with only the 2nd key element as key (i.e. the
+    result of tuple_to_simple_dict() for every 1st key element at once).
+
+    NB: keys with zero value are removed.
+    """
+    simple_dicts = dict()
+    for (k, v) in iteritems(dictionary):
+        if v > 0:
+            try:
+                simple_dicts[k[0]][k[1]] = v
+            except KeyError:
+                simple_dicts[k[0]] = {k[1]: v}
+    return simple_dicts
+
+
 def tuple_to_simple_dict_transpose(dictionary, key):
     """Take a dict with size-2 tuple key and a value for the 1st key element,
     and return a dict with only the 1st key element as key.
@@ -320,6 +471,7 @@ if __name__ == '__main__':
     my_dict = {('a', 'A'): 1, ('a', 'B'): 2, ('b', 'A'): 0, ('b', 'B'): 3}
     print(tuple_to_simple_dict(my_dict, 'a'))
     print(tuple_to_simple_dict(my_dict, 'b'))
+    print(tuple_to_simple_dicts(my_dict))
     values = [2, 3, 4]
     weights = [2, 1, 1]
     print(get_average(values))
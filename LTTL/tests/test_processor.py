@@ -0,0 +1,899 @@
+"""
+Module TestProcessor.py
+Copyright 2016 LangTech Sarl (info@langtech.ch)
+-----------------------------------------------------------------------------
+This file is part of the LTTL package v2.0
+
+LTTL v2.0 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+LTTL v2.0 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with LTTL v2.0. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+__version__ = "1.0.0"
+
+import unittest
+
+import re
+import sys
+import math
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from LTTL.Segment import Segment
+from LTTL.Segmentation import Segmentation
+from LTTL.Input import Input
+from LTTL import Segmenter
+from LTTL import Processor
+
+
+class TestProcessor(unittest.TestCase):
+    """Test suite for LTTL Processor module"""
+
+    def setUp(self):
+        """ Setting up for the test """
+        # Two strings, 'a b a' and 'b c', segmented into texts and words...
+        self.input1 = Input('a b a', 'text1')
+        self.input2 = Input('b c', 'text2')
+        str_index1 = self.input1[0].str_index
+        str_index2 = self.input2[0].str_index
+        self.text_seg = Segmenter.concatenate(
+            [self.input1, self.input2],
+            import_labels_as='doc',
+        )
+        self.word_seg = Segmenter.tokenize(
+            self.text_seg,
+            [(re.compile(r'\w+'), 'tokenize')],
+        )
+
+        # Words with annotation key 'pos' missing on some segments...
+        self.pos_seg = Segmentation(
+            [
+                Segment(str_index1, 0, 1, {'pos': 'x'}),
+                Segment(str_index1, 2, 3),
+                Segment(str_index1, 4, 5, {'pos': 'y'}),
+                Segment(str_index2, 0, 1, {'pos': 'x'}),
+                Segment(str_index2, 2, 3),
+            ]
+        )
+
+        # Overlapping segments, whose strings are not in str_index order...
+        self.unsorted_seg = Segmentation(
+            [
+                Segment(str_index2, 0, 1),
+                Segment(str_index2, 0, 3),
+                Segment(str_index2, 2, 3),
+                Segment(str_index1, 0, 3),
+                Segment(str_index1, 2, 3),
+                Segment(str_index1, 2, 5),
+                Segment(str_index1, 4, 5),
+            ]
+        )
+
+        # Key segment 'b' at the start of the second string...
+        self.key_seg = Segmentation([Segment(str_index2, 0, 1)])
+
+        # Empty string...
+        self.empty_input = Input('')
+        self.empty_word_seg = Segmenter.tokenize(
+            self.empty_input,
+            [(re.compile(r'\w+'), 'tokenize')],
+        )
+
+    def tearDown(self):
+        """Cleaning up after the test"""
+        pass
+
+    def assertTable(self, table, row_ids, col_ids, values, msg=None):
+        """Check row ids and col ids (in any order) and values of a table"""
+        self.assertEqual(sorted(table.row_ids), sorted(row_ids), msg=msg)
+        self.assertEqual(sorted(table.col_ids), sorted(col_ids), msg=msg)
+        self.assertEqual(sorted(table.values), sorted(values), msg=msg)
+        for key, value in values.items():
+            if isinstance(value, float):
+                self.assertAlmostEqual(table.values[key], value, msg=msg)
+            else:
+                self.assertEqual(table.values[key], value, msg=msg)
+
+    def test_count_in_context(self):
+        """Does count_in_context() count units in contexts?"""
+        table = Processor.count_in_context(
+            {'segmentation': self.word_seg},
+            {'segmentation': self.text_seg},
+        )
+        self.assertTable(
+            table,
+            ['a b a', 'b c'],
+            ['a', 'b', 'c'],
+            {
+                ('a b a', 'a'): 2,
+                ('a b a', 'b'): 1,
+                ('b c', 'b'): 1,
+                ('b c', 'c'): 1,
+            },
+            msg="count_in_context() doesn't count units in contexts!"
+        )
+
+    def test_count_in_context_annotated_contexts(self):
+        """Does count_in_context() use context annotations?"""
+        table = Processor.count_in_context(
+            {'segmentation': self.word_seg},
+            {'segmentation': self.text_seg, 'annotation_key': 'doc'},
+        )
+        self.assertTable(
+            table,
+            ['text1', 'text2'],
+            ['a', 'b', 'c'],
+            {
+                ('text1', 'a'): 2,
+                ('text1', 'b'): 1,
+                ('text2', 'b'): 1,
+                ('text2', 'c'): 1,
+            },
+            msg="count_in_context() doesn't use context annotations!"
+        )
+
+    def test_count_in_context_merge(self):
+        """Does count_in_context() merge contexts?"""
+        table = Processor.count_in_context(
+            {'segmentation': self.word_seg},
+            {'segmentation': self.text_seg, 'merge': True},
+        )
+        self.assertTable(
+            table,
+            ['__global__'],
+            ['a', 'b', 'c'],
+            {
+                ('__global__', 'a'): 2,
+                ('__global__', 'b'): 2,
+                ('__global__', 'c'): 1,
+            },
+            msg="count_in_context() doesn't merge contexts!"
+        )
+
+    def test_count_in_context_sequences(self):
+        """Does count_in_context() keep sequences within contexts?"""
+        table = Processor.count_in_context(
+            {'segmentation': self.word_seg, 'seq_length': 2},
+            {'segmentation': self.text_seg},
+        )
+        self.assertTable(
+            table,
+            ['a b a', 'b c'],
+            ['a#b', 'b#a', 'b#c'],
+            {
+                ('a b a', 'a#b'): 1,
+                ('a b a', 'b#a'): 1,
+                ('b c', 'b#c'): 1,
+            },
+            msg="count_in_context() doesn't keep sequences within contexts!"
+        )
+
+    def test_count_in_context_sequences_merge(self):
+        """Does count_in_context() keep sequences within merged contexts?"""
+        table = Processor.count_in_context(
+            {'segmentation': self.word_seg, 'seq_length': 2},
+            {'segmentation': self.text_seg, 'merge': True},
+        )
+        self.assertTable(
+            table,
+            ['__global__'],
+            ['a#b', 'b#a', 'b#c'],
+            {
+                ('__global__', 'a#b'): 1,
+                ('__global__', 'b#a'): 1,
+                ('__global__', 'b#c'): 1,
+            },
+            msg="count_in_context() doesn't keep sequences within merged "
+                "contexts!"
+        )
+
+    def test_count_in_context_sequences_no_context(self):
+        """Does count_in_context() count sequences across strings when no
+        context is specified?"""
+        table = Processor.count_in_context(
+            {'segmentation': self.word_seg, 'seq_length': 2},
+        )
+        self.assertTable(
+            table,
+            ['__global__'],
+            ['a#b', 'b#a', 'b#c'],
+            {
+                ('__global__', 'a#b'): 2,
+                ('__global__', 'b#a'): 1,
+                ('__global__', 'b#c'): 1,
+            },
+            msg="count_in_context() doesn't count sequences across strings "
+                "when no context is specified!"
+        )
+
+    def test_count_in_context_missing_annotation(self):
+        """Does count_in_context() count missing annotations as __none__?"""
+        table = Processor.count_in_context(
+            {'segmentation': self.pos_seg, 'annotation_key': 'pos'},
+            {'segmentation': self.text_seg},
+        )
+        self.assertTable(
+            table,
+            ['a b a', 'b c'],
+            ['__none__', 'x', 'y'],
+            {
+                ('a b a', '__none__'): 1,
+                ('a b a', 'x'): 1,
+                ('a b a', 'y'): 1,
+                ('b c', '__none__'): 1,
+                ('b c', 'x'): 1,
+            },
+            msg="count_in_context() doesn't count missing annotations!"
+        )
+
+    def test_count_in_context_unsorted_units(self):
+        """Does count_in_context() count overlapping, unsorted units?"""
+        table = Processor.count_in_context(
+            {'segmentation': self.unsorted_seg},
+            {'segmentation': self.text_seg},
+        )
+        self.assertTable(
+            table,
+            ['a b a', 'b c'],
+            ['a', 'a b', 'b', 'b a', 'b c', 'c'],
+            {
+                ('a b a', 'a'): 1,
+                ('a b a', 'a b'): 1,
+                ('a b a', 'b'): 1,
+                ('a b a', 'b a'): 1,
+                ('b c', 'b'): 1,
+                ('b c', 'b c'): 1,
+                ('b c', 'c'): 1,
+            },
+            msg="count_in_context() doesn't count unsorted units!"
+        )
+
+    def test_count_in_context_unsorted_sequences(self):
+        """Does count_in_context() count sequences of unsorted units?"""
+        table = Processor.count_in_context(
+            {'segmentation': self.unsorted_seg, 'seq_length': 2},
+            {'segmentation': self.text_seg},
+        )
+        self.assertTable(
+            table,
+            ['a b a', 'b c'],
+            ['a b#b', 'b#b a', 'b a#a', 'b#b c', 'b c#c'],
+            {
+                ('a b a', 'a b#b'): 1,
+                ('a b a', 'b#b a'): 1,
+                ('a b a', 'b a#a'): 1,
+                ('b c', 'b#b c'): 1,
+                ('b c', 'b c#c'): 1,
+            },
+            msg="count_in_context() doesn't count sequences of unsorted "
+                "units!"
+        )
+
+    def test_count_in_context_empty(self):
+        """Does count_in_context() handle an empty string?"""
+        table = Processor.count_in_context(
+            {'segmentation': self.empty_word_seg},
+            {'segmentation': self.empty_input},
+        )
+        self.assertTable(
+            table, [], [], {},
+            msg="count_in_context() doesn't handle an empty string!"
+        )
+
+    def test_count_in_window(self):
+        """Does count_in_window() count units in sliding windows?"""
+        table = Processor.count_in_window(
+            {'segmentation': self.pos_seg, 'annotation_key': 'pos'},
+            2,
+        )
+        self.assertTable(
+            table,
+            ['1', '2', '3', '4'],
+            ['__none__', 'x', 'y'],
+            {
+                ('1', '__none__'): 1,
+                ('1', 'x'): 1,
+                ('2', '__none__'): 1,
+                ('2', 'x'): 0,
+                ('2', 'y'): 1,
+                ('3', '__none__'): 0,
+                ('3', 'x'): 1,
+                ('3', 'y'): 1,
+                ('4', '__none__'): 1,
+                ('4', 'x'): 1,
+                ('4', 'y'): 0,
+            },
+            msg="count_in_window() doesn't count units in sliding windows!"
+        )
+
+    def test_count_in_window_sequences(self):
+        """Does count_in_window() count sequences in sliding windows?"""
+        table = Processor.count_in_window(
+            {'segmentation': self.word_seg, 'seq_length': 2},
+            2,
+        )
+        self.assertTable(
+            table,
+            ['1', '2', '3', '4'],
+            ['a#b', 'b#a', 'b#c'],
+            {
+                ('1', 'a#b'): 1,
+                ('2', 'a#b'): 0,
+                ('2', 'b#a'): 1,
+                ('3', 'a#b'): 1,
+                ('3', 'b#a'): 0,
+                ('4', 'a#b'): 0,
+                ('4', 'b#a'): 0,
+                ('4', 'b#c'): 1,
+            },
+            msg="count_in_window() doesn't count sequences in sliding "
+                "windows!"
+        )
+
+    def test_count_in_window_empty(self):
+        """Does count_in_window() handle an empty string?"""
+        table = Processor.count_in_window(
+            {'segmentation': self.empty_word_seg},
+            2,
+        )
+        self.assertEqual(
+            (table.col_ids, table.values),
+            ([], {}),
+            msg="count_in_window() doesn't handle an empty string!"
+        )
+
+    def test_count_in_chain(self):
+        """Does count_in_chain() keep windows within strings?"""
+        table = Processor.count_in_chain(
+            {'segmentation': self.word_seg},
+        )
+        self.assertTable(
+            table,
+            ['a_', 'b_'],
+            ['a', 'b', 'c'],
+            {
+                ('a_', 'b'): 1,
+                ('b_', 'a'): 1,
+                ('b_', 'c'): 1,
+            },
+            msg="count_in_chain() doesn't keep windows within strings!"
+        )
+
+    def test_count_in_chain_merge_strings(self):
+        """Does count_in_chain() merge strings?"""
+        table = Processor.count_in_chain(
+            {'segmentation': self.word_seg},
+            {'merge_strings': True},
+        )
+        self.assertTable(
+            table,
+            ['a_', 'b_'],
+            ['a', 'b', 'c'],
+            {
+                ('a_', 'b'): 2,
+                ('b_', 'a'): 1,
+                ('b_', 'c'): 1,
+            },
+            msg="count_in_chain() doesn't merge strings!"
+        )
+
+    def test_count_in_chain_sequences(self):
+        """Does count_in_chain() count sequences?"""
+        table = Processor.count_in_chain(
+            {'segmentation': self.word_seg, 'seq_length': 2},
+            {'left_size': 0, 'right_size': 1, 'merge_strings': True},
+        )
+        self.assertTable(
+            table,
+            ['_a', '_b', '_c'],
+            ['a#b', 'b#a'],
+            {
+                ('_a', 'a#b'): 1,
+                ('_b', 'b#a'): 1,
+                ('_c', 'a#b'): 1,
+            },
+            msg="count_in_chain() doesn't count sequences!"
+        )
+
+    def test_count_in_chain_missing_annotation(self):
+        """Does count_in_chain() count missing annotations as __none__?"""
+        table = Processor.count_in_chain(
+            {'segmentation': self.pos_seg, 'annotation_key': 'pos'},
+        )
+        self.assertTable(
+            table,
+            ['x_', '__none___'],
+            ['x', '__none__', 'y'],
+            {
+                ('x_', '__none__'): 2,
+                ('__none___', 'y'): 1,
+            },
+            msg="count_in_chain() doesn't count missing annotations!"
+        )
+
+    def test_count_in_chain_empty(self):
+        """Does count_in_chain() handle an empty string?"""
+        table = Processor.count_in_chain(
+            {'segmentation': self.empty_word_seg},
+        )
+        self.assertTable(
+            table, [], [], {},
+            msg="count_in_chain() doesn't handle an empty string!"
+        )
+
+    def test_length_in_context(self):
+        """Does length_in_context() count unsorted units in contexts?"""
+        table = Processor.length_in_context(
+            self.unsorted_seg,
+            None,
+            {'segmentation': self.text_seg},
+        )
+        self.assertTable(
+            table,
+            ['a b a', 'b c'],
+            ['__length__'],
+            {
+                ('a b a', '__length__'): 4,
+                ('b c', '__length__'): 3,
+            },
+            msg="length_in_context() doesn't count units in contexts!"
+        )
+
+    def test_length_in_context_merge(self):
+        """Does length_in_context() merge contexts?"""
+        table = Processor.length_in_context(
+            self.word_seg,
+            None,
+            {'segmentation': self.text_seg, 'merge': True},
+        )
+        self.assertTable(
+            table,
+            ['__global__'],
+            ['__length__'],
+            {('__global__', '__length__'): 5},
+            msg="length_in_context() doesn't merge contexts!"
+        )
+
+    def test_length_in_context_averaging(self):
+        """Does length_in_context() average lengths in contexts?"""
+        table = Processor.length_in_context(
+            self.unsorted_seg,
+            {'segmentation': self.word_seg, 'std_deviation': True},
+            {'segmentation': self.text_seg, 'annotation_key': 'doc'},
+        )
+        self.assertTable(
+            table,
+            ['text1', 'text2'],
+            [
+                '__length_average__',
+                '__length_std_deviation__',
+                '__length_count__',
+            ],
+            {
+                ('text1', '__length_average__'): 2 / 3,
+                ('text1', '__length_std_deviation__'): (2 / 9) ** 0.5,
+                ('text1', '__length_count__'): 3,
+                ('text2', '__length_average__'): 1.0,
+                ('text2', '__length_std_deviation__'): 0.0,
+                ('text2', '__length_count__'): 2,
+            },
+            msg="length_in_context() doesn't average lengths in contexts!"
+        )
+
+    def test_length_in_context_no_context(self):
+        """Does length_in_context() average lengths without contexts?"""
+        table = Processor.length_in_context(
+            self.word_seg,
+            {'segmentation': self.text_seg, 'std_deviation': True},
+        )
+        self.assertTable(
+            table,
+            ['__global__'],
+            [
+                '__length_average__',
+                '__length_std_deviation__',
+                '__length_count__',
+            ],
+            {
+                ('__global__', '__length_average__'): 2.5,
+                ('__global__', '__length_std_deviation__'): 0.5,
+                ('__global__', '__length_count__'): 2,
+            },
+            msg="length_in_context() doesn't average lengths without "
+                "contexts!"
+        )
+
+    def test_length_in_context_empty(self):
+        """Does length_in_context() handle an empty string?"""
+        table = Processor.length_in_context(
+            self.empty_word_seg,
+            None,
+            {'segmentation': self.empty_input},
+        )
+        self.assertTable(
+            table, [], ['__length__'], {},
+            msg="length_in_context() doesn't handle an empty string!"
+        )
+
+    def test_length_in_context_cache(self):
+        """Does length_in_context() cache counts for a single unit
+        segmentation?"""
+        for _ in range(5):
+            Processor.length_in_context(
+                Segmentation(list(self.word_seg)),
+                None,
+                {'segmentation': self.text_seg},
+            )
+        self.assertEqual(
+            [
+                key for key in self.text_seg._columns
+                if key == '__contained_unit_counts__'
+            ],
+            ['__contained_unit_counts__'],
+            msg="length_in_context() caches counts for several unit "
+                "segmentations!"
+        )
+
+    def test_length_in_context_modified_units(self):
+        """Does length_in_context() reflect modified units?"""
+        Processor.length_in_context(
+            self.word_seg,
+            None,
+            {'segmentation': self.text_seg},
+        )
+        self.word_seg.append(Segment(self.input2[0].str_index, 0, 3))
+        table = Processor.length_in_context(
+            self.word_seg,
+            None,
+            {'segmentation': self.text_seg},
+        )
+        self.assertEqual(
+            table.values[('b c', '__length__')],
+            3,
+            msg="length_in_context() doesn't reflect modified units!"
+        )
+
+    def test_length_in_window(self):
+        """Does length_in_window() average lengths in sliding windows?"""
+        table = Processor.length_in_window(
+            self.unsorted_seg,
+            {'segmentation': self.word_seg},
+            3,
+        )
+        self.assertTable(
+            table,
+            ['1', '2', '3'],
+            ['__length_average__', '__length_count__'],
+            {
+                ('1', '__length_average__'): 2 / 3,
+                ('1', '__length_count__'): 3,
+                ('2', '__length_average__'): 1.0,
+                ('2', '__length_count__'): 3,
+                ('3', '__length_average__'): 1.0,
+                ('3', '__length_count__'): 3,
+            },
+            msg="length_in_window() doesn't average lengths in sliding "
+                "windows!"
+        )
+
+    def test_variety_in_context(self):
+        """Does variety_in_context() count distinct units in contexts?"""
+        table = Processor.variety_in_context(
+            {'segmentation': self.word_seg},
+            None,
+            {'segmentation': self.text_seg},
+        )
+        self.assertTable(
+            table,
+            ['a b a', 'b c'],
+            ['__variety__'],
+            {
+                ('a b a', '__variety__'): 2,
+                ('b c', '__variety__'): 2,
+            },
+            msg="variety_in_context() doesn't count distinct units!"
+        )
+
+    def test_variety_in_context_missing_annotation(self):
+        """Does variety_in_context() count missing annotations in merged
+        contexts?"""
+        table = Processor.variety_in_context(
+            {'segmentation': self.pos_seg, 'annotation_key': 'pos'},
+            None,
+            {'segmentation': self.text_seg, 'merge': True},
+        )
+        self.assertTable(
+            table,
+            ['__global__'],
+            ['__variety__'],
+            {('__global__', '__variety__'): 3},
+            msg="variety_in_context() doesn't count missing annotations!"
+        )
+
+    def test_variety_in_context_per_category(self):
+        """Does variety_in_context() measure variety per category?"""
+        table = Processor.variety_in_context(
+            {'segmentation': self.pos_seg},
+            {'annotation_key': 'pos'},
+            {'segmentation': self.text_seg},
+            measure_per_category=True,
+        )
+        self.assertTable(
+            table,
+            ['a b a', 'b c'],
+            ['__variety__'],
+            {
+                ('a b a', '__variety__'): 1.0,
+                ('b c', '__variety__'): 1.0,
+            },
+            msg="variety_in_context() doesn't measure variety per category!"
+        )
+
+    def test_variety_in_window(self):
+        """Does variety_in_window() count distinct units in windows?"""
+        table = Processor.variety_in_window(
+            {'segmentation': self.word_seg},
+            None,
+            window_size=3,
+        )
+        self.assertTable(
+            table,
+            ['1', '2', '3'],
+            ['__variety__'],
+            {
+                ('1', '__variety__'): 2,
+                ('2', '__variety__'): 2,
+                ('3', '__variety__'): 3,
+            },
+            msg="variety_in_window() doesn't count distinct units!"
+        )
+
+    def test_annotate_contexts(self):
+        """Does annotate_contexts() annotate contexts with their most
+        frequent unit?"""
+        table = Processor.annotate_contexts(
+            {'segmentation': self.word_seg},
+            None,
+            {'segmentation': self.text_seg},
+        )
+        self.assertTable(
+            table,
+            ['a b a', 'b c'],
+            ['__annotation__'],
+            {
+                ('a b a', '__annotation__'): 'a',
+                ('b c', '__annotation__'): 'b',
+            },
+            msg="annotate_contexts() doesn't annotate contexts!"
+        )
+
+    def test_annotate_contexts_missing_annotation(self):
+        """Does annotate_contexts() handle missing annotations?"""
+        table = Processor.annotate_contexts(
+            {'segmentation': self.pos_seg, 'annotation_key': 'pos'},
+            None,
+            {'segmentation': self.text_seg},
+        )
+        self.assertTable(
+            table,
+            ['a b a', 'b c'],
+            ['__annotation__'],
+            {
+                ('a b a', '__annotation__'): 'x',
+                ('b c', '__annotation__'): 'x',
+            },
+            msg="annotate_contexts() doesn't handle missing annotations!"
+        )
+
+    def test_context(self):
+        """Does context() display units within their context?"""
+        table = Processor.context(
+            {'segmentation': self.pos_seg, 'annotation_key': 'pos'},
+            {'segmentation': self.text_seg, 'max_num_chars': 2},
+        )
+        self.assertTable(
+            table,
+            [1, 2, 3, 4, 5],
+            ['__pos__', '__left__', '__key_segment__', '__right__', 'pos'],
+            {
+                (1, '__key_segment__'): 'a',
+                (1, '__pos__'): 1,
+                (1, '__right__'): ' b',
+                (1, 'pos'): 'x',
+                (2, '__key_segment__'): 'b',
+                (2, '__left__'): 'a ',
+                (2, '__pos__'): 1,
+                (2, '__right__'): ' a',
+                (2, 'pos'): '__none__',
+                (3, '__key_segment__'): 'a',
+                (3, '__left__'): 'b ',
+                (3, '__pos__'): 1,
+                (3, 'pos'): 'y',
+                (4, '__key_segment__'): 'b',
+                (4, '__pos__'): 2,
+                (4, '__right__'): ' c',
+                (4, 'pos'): 'x',
+                (5, '__key_segment__'): 'c',
+                (5, '__left__'): 'b ',
+                (5, '__pos__'): 2,
+                (5, 'pos'): '__none__',
+            },
+            msg="context() doesn't display units within their context!"
+        )
+
+    def test_context_unsorted_units(self):
+        """Does context() display overlapping, unsorted units?"""
+        table = Processor.context(
+            {'segmentation': self.unsorted_seg},
+            {'segmentation': self.text_seg},
+        )
+        self.assertEqual(
+            [
+                table.values[row_id, '__key_segment__']
+                for row_id in sorted(table.row_ids)
+            ],
+            ['a b', 'b', 'b a', 'a', 'b', 'b c', 'c'],
+            msg="context() doesn't display unsorted units!"
+        )
+
+
+    def test_neighbors_string_boundary(self):
+        """Does neighbors() stop at string boundaries?"""
+        table = Processor.neighbors(
+            {'segmentation': self.key_seg},
+            {'segmentation': self.word_seg, 'max_distance': 1},
+        )
+        self.assertTable(
+            table,
+            [1],
+            ['__pos__', '__key_segment__', '1L', '1R'],
+            {
+                (1, '__pos__'): 4,
+                (1, '__key_segment__'): 'b',
+                (1, '1R'): 'c',
+            },
+            msg="neighbors() doesn't stop at string boundaries!"
+        )
+
+    def test_neighbors_merge_strings(self):
+        """Does neighbors() cross string boundaries when merging strings?"""
+        table = Processor.neighbors(
+            {'segmentation': self.key_seg},
+            {
+                'segmentation': self.word_seg,
+                'max_distance': 2,
+                'merge_strings': True,
+            },
+        )
+        self.assertTable(
+            table,
+            [1],
+            ['__pos__', '__key_segment__', '2L', '1L', '1R', '2R'],
+            {
+                (1, '__pos__'): 4,
+                (1, '__key_segment__'): 'b',
+                (1, '2L'): 'b',
+                (1, '1L'): 'a',
+                (1, '1R'): 'c',
+            },
+            msg="neighbors() doesn't cross string boundaries when merging "
+                "strings!"
+        )
+
+    def test_neighbors_no_max_distance(self):
+        """Does neighbors() find all neighbors without max distance?"""
+        table = Processor.neighbors(
+            {'segmentation': self.key_seg},
+            {'segmentation': self.word_seg, 'merge_strings': True},
+        )
+        self.assertTable(
+            table,
+            [1],
+            [
+                '__pos__', '__key_segment__',
+                '4L', '3L', '2L', '1L', '1R', '2R', '3R', '4R',
+            ],
+            {
+                (1, '__pos__'): 4,
+                (1, '__key_segment__'): 'b',
+                (1, '3L'): 'a',
+                (1, '2L'): 'b',
+                (1, '1L'): 'a',
+                (1, '1R'): 'c',
+            },
+            msg="neighbors() doesn't find all neighbors without max "
+                "distance!"
+        )
+
+    def test_collocations_string_boundary(self):
+        """Does collocations() stop at string boundaries?"""
+        table = Processor.collocations(
+            Segmentation([Segment(self.input1[0].str_index, 4, 5)]),
+            {'segmentation': self.word_seg, 'max_distance': 1},
+        )
+        self.assertTable(
+            table,
+            ['b'],
+            [
+                '__mutual_info__',
+                '__local_freq__',
+                '__local_prob__',
+                '__global_freq__',
+                '__global_prob__',
+            ],
+            {
+                ('b', '__mutual_info__'): math.log(1 / 0.4, 2),
+                ('b', '__local_freq__'): 1,
+                ('b', '__local_prob__'): 1.0,
+                ('b', '__global_freq__'): 2,
+                ('b', '__global_prob__'): 0.4,
+            },
+            msg="collocations() doesn't stop at string boundaries!"
+        )
+
+    def test_collocations_merge_strings(self):
+        """Does collocations() cross string boundaries when merging
+        strings?"""
+        table = Processor.collocations(
+            Segmentation([Segment(self.input1[0].str_index, 4, 5)]),
+            {
+                'segmentation': self.word_seg,
+                'max_distance': 1,
+                'merge_strings': True,
+            },
+        )
+        self.assertEqual(
+            (table.row_ids, table.values[('b', '__local_freq__')]),
+            (['b'], 2),
+            msg="collocations() doesn't cross string boundaries when "
+                "merging strings!"
+        )
+
+    def test_collocations_no_max_distance(self):
+        """Does collocations() find all neighbors without max distance?"""
+        table = Processor.collocations(
+            self.key_seg,
+            {'segmentation': self.word_seg, 'merge_strings': True},
+        )
+        self.assertEqual(
+            dict(
+                (row_id, table.values[(row_id, '__local_freq__')])
+                for row_id in table.row_ids
+            ),
+            {'a': 2, 'b': 1, 'c': 1},
+            msg="collocations() doesn't find all neighbors without max "
+                "distance!"
+        )
+
+    def test_collocations_no_max_distance_string_boundary(self):
+        """Does collocations() stop at string boundaries without max
+        distance?"""
+        table = Processor.collocations(
+            self.key_seg,
+            {'segmentation': self.word_seg},
+        )
+        self.assertEqual(
+            dict(
+                (row_id, table.values[(row_id, '__local_freq__')])
+                for row_id in table.row_ids
+            ),
+            {'c': 1},
+            msg="collocations() doesn't stop at string boundaries without "
+                "max distance!"
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -206,6 +206,35 @@ class TestSegmentation(unittest.TestCase):
             msg="get_annotation_keys() doesn't return existing annotations!"
         )
 
+    def test_get_contents(self):
+        """Does get_contents() return segment contents?"""
+        self.assertEqual(
+            self.word_seg.get_contents(),
+            ('ab', 'cde'),
+            msg="get_contents() doesn't return segment contents!"
+        )
+
+    def test_get_contents_after_update(self):
+        """Does get_contents() reflect modified strings and segments?"""
+        self.word_seg.get_contents()
+        self.entire_text_seg.update('xy zzz')
+        self.word_seg.append(
+            Segment(str_index=self.str_index, start=0, end=1)
+        )
+        self.assertEqual(
+            self.word_seg.get_contents(),
+            ('xy', 'zzz', 'x'),
+            msg="get_contents() doesn't reflect modifications!"
+        )
+
+    def test_get_annotation_values(self):
+        """Does get_annotation_values() return annotation values?"""
+        self.assertEqual(
+            self.word_seg.get_annotation_values('a'),
+            ('1', '__none__'),
+            msg="get_annotation_values() doesn't return annotation values!"
+        )
+
     def test_is_non_overlapping(self):
         """Does is_non_overlapping() recognize absence of overlap?"""
         self.assertTrue(
@@ -0,0 +1,169 @@
+"""
+Module TestUtils.py
+Copyright 2016 LangTech Sarl (info@langtech.ch)
+-----------------------------------------------------------------------------
+This file is part of the LTTL package v2.0
+
+LTTL v2.0 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+LTTL v2.0 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with LTTL v2.0. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+__version__ = "1.0.0"
+
+import unittest
+
+import random
+import sys
+from fractions import Fraction
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from scipy.special import comb
+
+from LTTL import Utils
+
+
+class TestUtils(unittest.TestCase):
+    """Test suite for LTTL Utils module"""
+
+    def setUp(self):
+        """ Setting up for the test """
+        # Frequency dicts whose keys are units prepended with a category...
+        self.category_dicts = [
+            {'N|cat': 3, 'N|dog': 1, 'V|sat': 2, 'D|the': 4},
+            {'N|cat': 1, 'V|sat': 1},
+            {'N|cat': 5, 'N|dog': 2, 'N|log': 1},
+            {'A|x': 1, 'A|y': 7, 'B|x': 2, 'B|z': 3, 'C|w': 1, 'C|x': 4},
+        ]
+
+    def tearDown(self):
+        """Cleaning up after the test"""
+        pass
+
+    def test_get_subsample_varieties(self):
+        """Does _get_subsample_varieties() match get_variety() on
+        sample_dict()? (up to rounding, since perplexities are summed in a
+        different order)"""
+        for dictionary in self.category_dicts:
+            sample_size = sum(dictionary.values())
+            for subsample_size in range(1, sample_size + 1):
+                for unit_weighting in (False, True):
+                    for category_weighting in (False, True):
+                        for category_delimiter in (None, '|'):
+                            random.seed(subsample_size)
+                            varieties = Utils._get_subsample_varieties(
+                                dictionary,
+                                subsample_size,
+                                5,
+                                unit_weighting,
+                                category_weighting,
+                                category_delimiter,
+                            )
+                            random.seed(subsample_size)
+                            expected_varieties = [
+                                Utils.get_variety(
+                                    Utils.sample_dict(
+                                        dictionary,
+                                        subsample_size,
+                                    ),
+                                    unit_weighting,
+                                    category_weighting,
+                                    category_delimiter,
+                                )
+                                for _ in range(5)
+                            ]
+                            self.assertEqual(
+                                len(varieties),
+                                len(expected_varieties),
+                                msg="_get_subsample_varieties() doesn't "
+                                    "match get_variety() on sample_dict()!"
+                            )
+                            for variety, expected_variety in zip(
+                                varieties,
+                                expected_varieties,
+                            ):
+                                self.assertAlmostEqual(
+                                    variety,
+                                    expected_variety,
+                                    places=12,
+                                    msg="_get_subsample_varieties() doesn't "
+                                        "match get_variety() on "
+                                        "sample_dict()!"
+                                )
+
+    def test_get_subsample_varieties_too_large(self):
+        """Does _get_subsample_varieties() return no variety for too large
+        subsamples?"""
+        self.assertEqual(
+            Utils._get_subsample_varieties({'a': 1, 'b': 2}, 4, 5),
+            [],
+            msg="_get_subsample_varieties() returns varieties for too large "
+                "subsamples!"
+        )
+
+
+    def test_get_expected_subsample_variety(self):
+        """Does get_expected_subsample_variety() match the exact binomial
+        computation?"""
+        for dictionary in self.category_dicts + [{'a': 1}, {'a': 2, 'b': 2}]:
+            sample_size = sum(dictionary.values())
+            for subsample_size in range(sample_size + 1):
+                num_subsamples = comb(sample_size, subsample_size, exact=True)
+                expected_variety = len(dictionary) - sum(
+                    Fraction(
+                        comb(sample_size - freq, subsample_size, exact=True),
+                        num_subsamples,
+                    )
+                    for freq in dictionary.values()
+                )
+                variety = Utils.get_expected_subsample_variety(
+                    dictionary,
+                    subsample_size,
+                )
+                self.assertLess(
+                    abs(variety - float(expected_variety)),
+                    2e-11 * max(float(expected_variety), 1),
+                    msg="get_expected_subsample_variety() doesn't match the "
+                        "exact binomial computation!"
+                )
+
+    def test_get_expected_subsample_variety_whole_sample(self):
+        """Does get_expected_subsample_variety() return the number of types
+        (as an int) for a subsample as large as the sample?"""
+        variety = Utils.get_expected_subsample_variety(
+            self.category_dicts[0],
+            10,
+        )
+        self.assertEqual(
+            (variety, type(variety)),
+            (4, int),
+            msg="get_expected_subsample_variety() doesn't return the number "
+                "of types for a subsample as large as the sample!"
+        )
+
+    def test_get_expected_subsample_variety_too_large(self):
+        """Does get_expected_subsample_variety() raise an exception for too
+        large subsamples?"""
+        with self.assertRaises(
+            ValueError,
+            msg="get_expected_subsample_variety() doesn't raise an exception "
+                "for too large subsamples!"
+        ):
+            Utils.get_expected_subsample_variety({'a': 1, 'b': 2}, 4)
+
+if __name__ == '__main__':
+    unittest.main()
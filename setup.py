@@ -77,7 +77,6 @@ setup(
         'numpy',
         'scipy',
         'future',
-        'backports.functools_lru_cache',
     ],
 
     test_suite='nose.collector',